@@ -1,221 +1,527 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import inspect
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 import httpx
-import json
+from app.core.codec import ChatRequestEncoder, dumps, loads
+from app.core.http_pool import HttpPool
+from app.core.intents import IntentRouter, normalize, query_terms, search_query
+from app.core.memory import ConversationMemory, estimate_tokens
+from app.core.model_router import ModelRouter
+from app.core.resilience import (RETRYABLE_STATUSES, ResilienceError, ResilientCaller,
+                                 UpstreamError, retry_after_seconds)
+from app.core.response_cache import ResponseCache
 from app.core.settings import Settings
+from app.core.tools import ToolError, registry
+from app.core.tracing import tracer
 from app.services.speak import SpeakService
-from app.services.system import SystemService
 from app.services.web import WebPageParser
 
 class Brain:
+    API_APOLOGY = "Прошу прощения, сэр, связь с моими серверами сейчас нарушена. Попробуйте чуть позже."
+    SYSTEM_PROMPT = "Ты — виртуальный ассистент в стиле Jarvis из Iron Man: вежливый, саркастичный, с британским акцентом. Отвечай кратко и с оттенком иронии. В твоем распоряжении имеются функции, активно используй их, если задача может быть решена с их помощью."
+
     def __init__(self):
         self.mistral_api_key = Settings().MISTRAL_API_KEY
         self.speak_service = SpeakService()
+        # Общий пул соединений с Mistral API: одно TLS-соединение на все запросы
+        self.http = HttpPool(
+            base_url=Settings().MISTRAL_API_URL,
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {self.mistral_api_key}'
+            },
+            ping_path="/v1/models"
+        )
+        # Быстрая модель для болтовни, сильная — для запросов с функциями
+        self.model_router = ModelRouter(
+            strong_model=Settings().MISTRAL_MODEL,
+            fast_model=Settings().MISTRAL_FAST_MODEL,
+            summary_model=Settings().MISTRAL_SUMMARY_MODEL
+        )
+        # Дедлайны, повторы при 429/5xx, хеджирование медленных запросов и circuit breaker
+        self.resilience = ResilientCaller(
+            deadline=Settings().MISTRAL_DEADLINE,
+            hedge=Settings().MISTRAL_HEDGING
+        )
         # Инициализируем веб-парсер с API ключами для поиска
         self.web_parser = WebPageParser(
             delay=2,
             api_key=Settings().GOOGLE_SEARCH_API_KEY,
-            cx=Settings().GOOGLE_SEARCH_CX
+            cx=Settings().GOOGLE_SEARCH_CX,
+            search_url=Settings().GOOGLE_SEARCH_URL,
+            parse_processes=Settings().WEB_PARSE_PROCESSES,
+            cache_dir=os.path.join(Settings().DATA_DIR, "page_cache"),
+            cache_mb=Settings().PAGE_CACHE_MB
         )
-        self.messages = [
-            {
-                "role": "system",
-                "content": "Ты — виртуальный ассистент в стиле Jarvis из Iron Man: вежливый, саркастичный, с британским акцентом. Отвечай кратко и с оттенком иронии. В твоем распоряжении имеются функции, активно используй их, если задача может быть решена с их помощью."
-            }
-        ]
-        self.tools = [
-            {
-                "type": "function",
-                "function": {
-                    "name": "open_app",
-                    "description": "Обязательно вызвать эту функцию, если пользователь просит открыть приложение (например, notepad, calc, mspaint). Не отвечай только текстом, если пользователь просит открыть приложение — всегда используй эту функцию, если пользователь попросил что-то открыть.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "app_name": {
-                                "type": "string",
-                                "description": "Название приложения (например, notepad, calc, mspaint)"
-                            }
-                        },
-                        "required": ["app_name"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "set_volume",
-                    "description": "Устанавливает громкость системы на указанный уровень. Вызывай эту функцию, если пользователь просит установить громкость на определенный уровень (например, 'поставь громкость на 50', 'сделай звук 30 процентов').",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "level": {
-                                "type": "integer",
-                                "description": "Уровень громкости от 0 до 100 процентов"
-                            }
-                        },
-                        "required": ["level"]
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "empty_recycle_bin",
-                    "description": "Очищает корзину. Вызывай эту функцию, если пользователь просит очистить корзину, удалить файлы из корзины или освободить место на диске.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {}
-                    }
-                }
-            },
-            {
-                "type": "function",
-                "function": {
-                    "name": "web_search",
-                    "description": "Выполняет поиск в интернете и возвращает содержимое найденных веб-страниц. Используй эту функцию, когда пользователь просит найти информацию в интернете, узнать последние новости, получить актуальные данные или найти ответы на вопросы, которые требуют поиска в сети.",
-                    "parameters": {
-                        "type": "object",
-                        "properties": {
-                            "query": {
-                                "type": "string",
-                                "description": "Поисковый запрос для поиска в интернете"
-                            },
-                            "num_results": {
-                                "type": "integer",
-                                "description": "Количество сайтов для анализа (по умолчанию 3, максимум 5)",
-                                "default": 3
-                            }
-                        },
-                        "required": ["query"]
-                    }
-                }
-            }
-        ]
-
-    async def get_answer(self, user_input: str) -> str:
-        async with httpx.AsyncClient() as client:
-            # Добавляем сообщение пользователя
-            self.messages.append({"role": "user", "content": user_input})
-
-            # Первый запрос к API
-            response = await client.post(
-                url="https://api.mistral.ai/v1/chat/completions",
-                headers={
-                    'Content-Type': 'application/json',
-                    'Authorization': f'Bearer {self.mistral_api_key}'
-                },
-                json={
-                    "model": 'mistral-small-2506',
-                    "temperature": 1.4,
-                    "messages": self.messages,
-                    "tools": self.tools,
-                    "tool_choice": "auto"
-                }
-            )
-            data = response.json()
-            print("Первый ответ от API:", data)
+        # Блокирующие функции выполняются в ограниченном пуле потоков, не останавливая event loop
+        self.tool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="brain-tool")
+        # Простые команды разбираются локально, без обращения к API
+        self.intent_router = IntentRouter()
+        # Кэш ответов на повторяющиеся вопросы (без функций и без привязки ко времени)
+        self.response_cache = ResponseCache(os.path.join(Settings().DATA_DIR, "response_cache.json"))
+        # История диалога с ограничением по токенам и фоновым пересказом старых реплик
+        self.memory = self.new_memory()
+        # Функции берутся из реестра; статический префикс запроса сериализуется один раз
+        self.tools = registry
+        self.encoder = ChatRequestEncoder(self.memory.system_message, self.tools)
+        # Интервалы этапов каждой реплики сохраняются в файл для chrome://tracing / Perfetto
+        tracer.path = Settings().TRACE_FILE or None
+        # Поиск по явному запросу свежих данных запускается, не дожидаясь ответа модели
+        self.speculative_search = Settings().SPECULATIVE_SEARCH
+        self.speculation_stats = {"started": 0, "used": 0, "wasted": 0}
+        # Первый запрос по стабильной промежуточной расшифровке речи, пока пользователь договаривает
+        self.speculative_asr = Settings().SPECULATIVE_ASR
+        self.prefetch_stats = {"started": 0, "used": 0, "wasted": 0}
+        self._prefetch = None
+
+    async def warm_up(self):
+        """Прогревает соединение с API, запускает keep-alive пинги и процессы разбора страниц"""
+        await asyncio.gather(self.http.warm_up(), self.web_parser.warm_up())
+        self.http.start_keepalive()
+
+    async def close(self):
+        await self.http.aclose()
+        await self.web_parser.aclose()
+        await asyncio.get_running_loop().run_in_executor(None, self.response_cache.flush)
+        self.tool_executor.shutdown(wait=False)
+
+    def pool_stats(self) -> dict:
+        return self.http.stats()
+
+    def new_memory(self) -> ConversationMemory:
+        """Отдельная история диалога (например, для сессии API-сервера)"""
+        return ConversationMemory(system_prompt=self.SYSTEM_PROMPT)
 
-            if "choices" not in data:
-                return str(data)  # возвращаем текст ошибки
+    async def compact_history(self, memory: ConversationMemory = None):
+        """Пересказывает выпавшие из окна реплики; вызывается в простое, а не во время ответа"""
+        if memory is None:
+            memory = self.memory
+        if memory.needs_summary():
+            await memory.summarize(self._complete)
 
-            message = data["choices"][0]["message"]
+    async def _complete(self, messages: list) -> str:
+        """Обычный (непотоковый) запрос без функций"""
+        body = self.encoder.encode(self.model_router.summary_model, messages, stream=False)
+        try:
+            with tracer.span("llm.complete", model=self.model_router.summary_model):
+                response = await self.resilience.call(lambda: self._post_completion(body))
+        except (ResilienceError, httpx.HTTPError) as e:
+            print("Ошибка пересказа истории:", e)
+            return ""
+        data = loads(response.content)
+        if "choices" not in data:
+            print("Ошибка пересказа истории:", data)
+            return ""
+        return data["choices"][0]["message"]["content"]
+
+    async def get_answer(self, user_input: str, memory: ConversationMemory = None) -> str:
+        """Возвращает ответ целиком (собирается из потока токенов)"""
+        tokens = []
+        async for token in self.stream_answer(user_input, memory):
+            tokens.append(token)
+        return "".join(tokens)
+
+    async def stream_answer(self, user_input: str, memory: ConversationMemory = None):
+        """
+        Асинхронный генератор токенов ответа (SSE-режим Mistral API).
+        memory — история собеседника (по умолчанию общая история локального ассистента).
+        При отмене (пользователь заговорил снова) реплика целиком убирается из истории,
+        HTTP-поток закрывается, а упреждающие вызовы отменяются.
+        """
+        if memory is None:
+            memory = self.memory
+        # Добавляем сообщение пользователя
+        memory.append({"role": "user", "content": user_input})
+        turn = memory.turns[-1]
+        speculation = {}
+        try:
+            with tracer.span("brain.answer"):
+                async with contextlib.aclosing(self._answer(user_input, speculation, memory)) as answer:
+                    async for token in answer:
+                        tracer.milestone("turn.first_token")
+                        yield token
+        except (asyncio.CancelledError, GeneratorExit):
+            print("Ответ отменён:", user_input)
+            memory.discard_turn(turn)
+            raise
+        finally:
+            self._discard_speculation(speculation)
+
+    async def _answer(self, user_input: str, speculation: dict, memory: ConversationMemory):
+        # Упреждающий запрос по промежуточной речи относится только к локальной истории
+        local = memory is self.memory
+        # Ответы из кэша одной истории не подаются другой (сессии API-сервера)
+        scope = "" if local else memory.id
+        # Быстрый путь: уверенно распознанная команда выполняется без LLM
+        intent = self.intent_router.match(user_input)
+        if intent is not None:
+            if local:
+                self._cancel_prefetch()
+            spec = self.tools.get(intent.name)
+            content, ok = await self._run_tool(spec, intent.arguments)
+            reply = (spec.render_reply(intent.arguments, intent.spoken) if ok else None) or content
+            memory.append({"role": "assistant", "content": reply})
+            yield reply
+            return
+
+        cached = self.response_cache.get(user_input, scope)
+        tracer.value("cache.hit", 1.0 if cached is not None else 0.0)
+        if cached is not None:
+            if local:
+                self._cancel_prefetch()
+            print("Ответ из кэша:", self.response_cache.stats())
+            memory.append({"role": "assistant", "content": cached})
+            yield cached
+            return
+
+        # Первый запрос к API
+        message = None
+        tool_names, model, body = self._first_request(user_input, memory.messages())
+        # Явный запрос свежих данных: поиск стартует параллельно с первым запросом к API
+        speculation.update(self._speculate(user_input, tool_names))
+        # Если этот же запрос уже отправлен по промежуточной расшифровке, дочитываем его ответ
+        completion = (self._take_prefetch(body) if local else None) or self._stream_completion(body, model)
+        async with contextlib.aclosing(completion):
+            async for token, completed in completion:
+                if completed is not None:
+                    message = completed
+                elif token:
+                    yield token
+        print("Первый ответ от API:", message)
+        print("Размер запроса:", memory.stats(), "функции:", tool_names,
+              "сэкономлено токенов на схемах:", self.tools.savings["last_tokens_saved"])
+
+        if message is None:
+            return
+
+        # Добавляем ответ ассистента в историю сообщений
+        memory.append(message)
+
+        # Проверяем наличие вызовов функций
+        if message.get("tool_calls"):
+            # Все вызовы из одного ответа выполняются параллельно
+            results = await asyncio.gather(*(
+                self._execute_tool_call(tool_call, speculation) for tool_call in message["tool_calls"]
+            ))
+            for result, _, _ in results:
+                # Добавляем ответ от функции в историю сообщений
+                memory.append(result)
+
+            # Функции с одним побочным эффектом (открыть, громкость, корзина) озвучиваем по шаблону,
+            # пересказ модели нужен только для данных (поиск) и ошибок
+            replies = [reply for _, ok, reply in results if ok and reply]
+            if len(replies) == len(results):
+                reply = " ".join(replies)
+                print("Ответ по шаблону, второй запрос к API пропущен:", reply)
+                memory.append({"role": "assistant", "content": reply})
+                yield reply
+                return
+
+            # Второй запрос к API с результатом выполнения функции
+            second_message = None
+            model = self.model_router.choose_followup([c["function"]["name"] for c in message["tool_calls"]])
+            completion = self._stream_completion(self.encoder.encode(model, memory.messages()), model)
+            async with contextlib.aclosing(completion):
+                async for token, completed in completion:
+                    if completed is not None:
+                        second_message = completed
+                    elif token:
+                        yield token
+            print("Второй ответ от API:", second_message)
+            print("Размер запроса:", memory.stats())
 
             # Добавляем ответ ассистента в историю сообщений
-            self.messages.append(message)
-
-            # Проверяем наличие вызовов функций
-            if message.get("tool_calls") is not None:
-                for tool_call in message["tool_calls"]:
-                    func = tool_call["function"]
-
-                    print(func)
-
-                    if func["name"] == "open_app":
-                        app = json.loads(func["arguments"])["app_name"]
-                        result = SystemService.open_app(app)
-                        print("LLM вызвал функцию:", result)
-
-                        # Добавляем ответ от функции в историю сообщений
-                        self.messages.append({
-                            "role": "tool",
-                            "content": f"Приложение {app} успешно открыто: {result}",
-                            "tool_call_id": tool_call["id"]
-                        })
-                    
-                    elif func["name"] == "set_volume":
-                        args = json.loads(func["arguments"])
-                        level = args.get("level", 50)
-                        result = SystemService.set_volume(level)
-                        print("LLM вызвал функцию set_volume:", result)
-
-                        # Добавляем ответ от функции в историю сообщений
-                        self.messages.append({
-                            "role": "tool",
-                            "content": f"Громкость установлена: {result}",
-                            "tool_call_id": tool_call["id"]
-                        })
-                    
-                    elif func["name"] == "empty_recycle_bin":
-                        result = SystemService.empty_recycle_bin()
-                        print("LLM вызвал функцию empty_recycle_bin:", result)
-
-                        # Добавляем ответ от функции в историю сообщений
-                        self.messages.append({
-                            "role": "tool",
-                            "content": f"Корзина очищена: {result}",
-                            "tool_call_id": tool_call["id"]
-                        })
-                    
-                    elif func["name"] == "web_search":
-                        args = json.loads(func["arguments"])
-                        query = args.get("query", "")
-                        num_results = args.get("num_results", 3)
-                        
-                        try:
-                            search_results = self.web_parser.web_search(query, num_results)
-                            # Объединяем результаты в одну строку для передачи модели
-                            combined_results = "\n\n".join(search_results[:3])  # Ограничиваем 3 результатами для экономии токенов
-                            result_summary = f"Найдено {len(search_results)} результатов по запросу '{query}'"
-                            
-                            print(f"LLM вызвал функцию web_search: {result_summary}")
-                            
-                            # Добавляем ответ от функции в историю сообщений
-                            self.messages.append({
-                                "role": "tool",
-                                "content": f"Результаты поиска по запросу '{query}':\n\n{combined_results}",
-                                "tool_call_id": tool_call["id"]
-                            })
-                        except Exception as e:
-                            error_msg = f"Ошибка при поиске: {str(e)}"
-                            print(f"Ошибка web_search: {error_msg}")
-                            
-                            # Добавляем ошибку в историю сообщений
-                            self.messages.append({
-                                "role": "tool",
-                                "content": error_msg,
-                                "tool_call_id": tool_call["id"]
-                            })
+            if second_message is not None:
+                memory.append(second_message)
+        else:
+            # Кэшируем только ответы, не потребовавшие вызова функций
+            self.response_cache.put(user_input, message.get("content"), scope)
 
-                # Второй запрос к API с результатом выполнения функции
-                second_response = await client.post(
-                    url="https://api.mistral.ai/v1/chat/completions",
-                    headers={
-                        'Content-Type': 'application/json',
-                        'Authorization': f'Bearer {self.mistral_api_key}'
-                    },
-                    json={
-                        "model": 'mistral-small-2506',
-                        "messages": self.messages,
-                    }
+        print("Статистика пула соединений:", self.pool_stats())
+        print("Задержки моделей:", self.model_router.stats())
+        if self.speculation_stats["started"]:
+            print("Упреждающие вызовы:", self.speculation_stats)
+        if self.prefetch_stats["started"]:
+            print("Запросы по промежуточной речи:", self.prefetch_stats)
+
+    def _first_request(self, user_input: str, messages: list, preview: bool = False) -> tuple:
+        """Функции, модель и тело первого запроса к API для реплики (preview — без учёта в статистике)"""
+        # В запрос идут только функции, уместные для этой реплики
+        tool_names = self.tools.match(user_input) if preview else self.tools.select(user_input)
+        # Сильная модель — когда реплика явно просит функцию, а не ради всегда доступного поиска
+        model = self.model_router.choose(user_input, tools_needed=bool(self.tools.mentioned(user_input)))
+        body = self.encoder.encode(model, messages, tools=tool_names, temperature=1.4)
+        return tool_names, model, body
+
+    def prefetch(self, partial_text: str):
+        """
+        Отправляет первый запрос по промежуточной расшифровке, не трогая историю.
+        Вызывается в потоке event loop; если итоговая реплика совпадёт, stream_answer подхватит этот ответ.
+        """
+        if not self.speculative_asr or self.intent_router.match(partial_text) is not None:
+            return
+        if self.response_cache.contains(partial_text):
+            # Такая реплика отвечается из кэша — запрос к модели не понадобится
+            self._cancel_prefetch()
+            return
+        preview = self.memory.preview({"role": "user", "content": partial_text})
+        tool_names, model, body = self._first_request(partial_text, preview, preview=True)
+        if self._prefetch is not None:
+            if self._prefetch[0] == body:
+                return
+            self._cancel_prefetch()
+
+        self.prefetch_stats["started"] += 1
+        events = asyncio.Queue()
+        task = asyncio.ensure_future(self._fill_prefetch(body, model, events))
+        self._prefetch = (body, task, events)
+
+    async def _fill_prefetch(self, body: bytes, model: str, events: asyncio.Queue):
+        try:
+            async for event in self._stream_completion(body, model):
+                events.put_nowait(event)
+        finally:
+            events.put_nowait(None)
+
+    def _take_prefetch(self, body: bytes):
+        """Поток событий упреждающего запроса с тем же телом или None"""
+        prefetch, self._prefetch = self._prefetch, None
+        if prefetch is None:
+            return None
+        if prefetch[0] != body:
+            self.prefetch_stats["wasted"] += 1
+            prefetch[1].cancel()
+            return None
+        self.prefetch_stats["used"] += 1
+        return self._replay_prefetch(prefetch[1], prefetch[2])
+
+    async def _replay_prefetch(self, task, events: asyncio.Queue):
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            task.cancel()
+
+    def discard_prefetch(self):
+        """Итоговой реплики не будет (речь не распознана, прослушивание прервано) — упреждающий запрос не нужен"""
+        self._cancel_prefetch()
+
+    def _cancel_prefetch(self):
+        if self._prefetch is not None:
+            self.prefetch_stats["wasted"] += 1
+            self._prefetch[1].cancel()
+            self._prefetch = None
+
+    def _speculate(self, user_input: str, tool_names: tuple) -> dict:
+        """Запускает вероятные вызовы функций заранее; возвращает (аргументы, задача) по имени функции"""
+        if not self.speculative_search or "web_search" not in tool_names:
+            return {}
+        query = search_query(user_input)
+        if query is None:
+            return {}
+        self.speculation_stats["started"] += 1
+        print("Упреждающий поиск:", query)
+        args = {"query": query}
+        return {"web_search": (args, asyncio.ensure_future(self._run_tool(self.tools.get("web_search"), args)))}
+
+    def _discard_speculation(self, speculation: dict):
+        """Отменяет упреждающие вызовы, которые модель так и не запросила"""
+        for _, task in speculation.values():
+            self.speculation_stats["wasted"] += 1
+            task.cancel()
+        speculation.clear()
+
+    @staticmethod
+    def _same_call(spec, speculated: dict, requested: dict) -> bool:
+        """
+        Модель просит то же, что вызвано заранее: аргументы совпадают с учётом значений по умолчанию,
+        а текстовые — по значимым словам (модель обычно переформулирует запрос: «найди новости про X»)
+        """
+        defaults = {
+            name: parameter.default for name, parameter in inspect.signature(spec.handler).parameters.items()
+            if parameter.default is not inspect.Parameter.empty
+        }
+        speculated, requested = {**defaults, **speculated}, {**defaults, **requested}
+        def same(value, other) -> bool:
+            if isinstance(value, str) and isinstance(other, str):
+                return query_terms(value) == query_terms(other)
+            return normalize(str(value)) == normalize(str(other))
+
+        return speculated.keys() == requested.keys() and all(
+            same(value, requested[name]) for name, value in speculated.items()
+        )
+
+    async def _stream_completion(self, body: bytes, model: str = None):
+        """
+        Выполняет потоковый запрос к chat/completions с готовым телом запроса.
+        Выдаёт пары (токен, None) по мере прихода и в конце (None, сообщение)
+        с собранным сообщением ассистента, включая tool_calls.
+        """
+        with tracer.span("llm.stream", model=model):
+            tracer.value("llm.request_tokens", estimate_tokens(body.decode("utf-8", errors="replace")))
+            content = []
+            tool_calls = {}
+            started = time.perf_counter()
+            first_chunk = True
+            try:
+                # Повторы, хеджирование и дедлайн действуют до получения заголовков ответа
+                response, stream = await self.resilience.call(
+                    lambda: self._open_stream(body),
+                    discard=lambda opened: opened[1].aclose()
                 )
-                second_data = second_response.json()
-                second_message = second_data["choices"][0]["message"]
-                print("Второй ответ от API:", second_data)
+            except (ResilienceError, httpx.HTTPError) as e:
+                print(f"Mistral API недоступен: {e}")
+                yield self.API_APOLOGY, None
+                return
+
+            async with stream:
+                if response.status_code != 200:
+                    # Возвращаем текст ошибки вместо ответа
+                    error = (await response.aread()).decode("utf-8", errors="replace")
+                    yield error, None
+                    return
+
+                try:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            # Дочитываем поток до конца, чтобы HTTP/1.1-соединение вернулось в пул
+                            continue
+
+                        chunk = loads(data)
+                        if first_chunk:
+                            # Задержка до первого токена — основа для выбора модели
+                            elapsed = time.perf_counter() - started
+                            if model is not None:
+                                self.model_router.record(model, elapsed)
+                            tracer.record("llm.first_token", elapsed, model=model)
+                            first_chunk = False
+                        if not chunk.get("choices"):
+                            continue
+                        delta = chunk["choices"][0].get("delta", {})
+
+                        token = delta.get("content")
+                        if token:
+                            content.append(token)
+                            yield token, None
+
+                        # Аргументы функций могут приходить частями — собираем по индексу
+                        for call_delta in delta.get("tool_calls") or []:
+                            call = tool_calls.setdefault(call_delta.get("index", len(tool_calls)), {
+                                "id": "",
+                                "type": "function",
+                                "function": {"name": "", "arguments": ""}
+                            })
+                            if call_delta.get("id"):
+                                call["id"] = call_delta["id"]
+                            function = call_delta.get("function", {})
+                            call["function"]["name"] += function.get("name") or ""
+                            arguments = function.get("arguments") or ""
+                            if not isinstance(arguments, str):
+                                arguments = dumps(arguments).decode("utf-8")
+                            call["function"]["arguments"] += arguments
+                except httpx.HTTPError as e:
+                    # Обрыв соединения посреди ответа
+                    print(f"Поток ответа прервался: {e}")
+                    self.resilience.breaker.record_failure()
+                    yield " " + self.API_APOLOGY, None
+                    return
+
+            message = {"role": "assistant", "content": "".join(content)}
+            if tool_calls:
+                message["tool_calls"] = [tool_calls[index] for index in sorted(tool_calls)]
+            yield None, message
+
+    async def _open_stream(self, body: bytes):
+        """Одна попытка открыть SSE-поток; 429/5xx превращаются в UpstreamError для повтора"""
+        stack = contextlib.AsyncExitStack()
+        try:
+            response = await stack.enter_async_context(
+                self.http.stream("POST", "/v1/chat/completions", content=body)
+            )
+            if response.status_code in RETRYABLE_STATUSES:
+                error = (await response.aread()).decode("utf-8", errors="replace")
+                raise UpstreamError(response.status_code, error, retry_after_seconds(response))
+        except BaseException:
+            await stack.aclose()
+            raise
+        return response, stack
+
+    async def _post_completion(self, body: bytes):
+        response = await self.http.post("/v1/chat/completions", content=body)
+        if response.status_code in RETRYABLE_STATUSES:
+            raise UpstreamError(response.status_code, response.text, retry_after_seconds(response))
+        return response
+
+    async def _execute_tool_call(self, tool_call: dict, speculation: dict = None) -> tuple:
+        """
+        Выполняет вызов функции из ответа модели; если такой вызов уже запущен упреждающе, берёт его результат.
+        Возвращает сообщение с результатом для истории, признак успеха и готовую фразу по шаблону (или None).
+        """
+        func = tool_call["function"]
+        print(func)
 
-                # Добавляем ответ ассистента в историю сообщений
-                self.messages.append(second_message)
+        spec = self.tools.get(func["name"])
+        reply = None
+        if spec is None:
+            content, ok = f"Неизвестная функция: {func['name']}", False
+        else:
+            try:
+                args = loads(func["arguments"] or "{}")
+            except ValueError as e:
+                content, ok = f"Некорректные аргументы {func['name']}: {str(e)}", False
+            else:
+                prefetched = speculation.pop(spec.name, None) if speculation else None
+                if prefetched is not None and not self._same_call(spec, prefetched[0], args):
+                    # Модель сформулировала запрос иначе — заранее найденное ей не подходит
+                    self.speculation_stats["wasted"] += 1
+                    prefetched[1].cancel()
+                    prefetched = None
+                if prefetched is not None:
+                    self.speculation_stats["used"] += 1
+                    content, ok = await prefetched[1]
+                else:
+                    content, ok = await self._run_tool(spec, args)
+                if ok:
+                    reply = spec.render_reply(args)
 
-                # Возвращаем финальный ответ от модели
-                return second_message["content"]
+        message = {
+            "role": "tool",
+            "content": content,
+            "tool_call_id": tool_call["id"]
+        }
+        return message, ok, reply
 
-            # Если функции не вызывались, возвращаем текстовый ответ
-            return message['content']
+    async def _run_tool(self, spec, args: dict) -> tuple:
+        """Запускает обработчик с таймаутом; возвращает (результат или текст ошибки, признак успеха)"""
+        try:
+            with tracer.span(f"tool.{spec.name}"):
+                if asyncio.iscoroutinefunction(spec.handler):
+                    call = spec.handler(self, **args)
+                else:
+                    # Контекст (номер реплики для трассировки) переносится в поток пула
+                    call = asyncio.get_running_loop().run_in_executor(
+                        self.tool_executor,
+                        functools.partial(contextvars.copy_context().run, spec.handler, self, **args)
+                    )
+                return await asyncio.wait_for(call, spec.timeout), True
+        except asyncio.TimeoutError:
+            print(f"Таймаут {spec.name}")
+            return f"Функция {spec.name} не ответила за {spec.timeout} с", False
+        except ToolError as e:
+            print(f"Функция {spec.name} не выполнена: {e}")
+            return str(e), False
+        except Exception as e:
+            content = f"Ошибка при выполнении {spec.name}: {str(e)}"
+            print(f"Ошибка {spec.name}: {content}")
+            return content, False
@@ -0,0 +1,63 @@
+"""
+Быстрая сериализация JSON и сборка тел запросов к chat/completions
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class ChatRequestEncoder:
+    """
+    Собирает тело запроса из заранее сериализованного статического префикса
+    (модель, параметры, схемы функций, системный промпт) и сообщений диалога.
+    """
+
+    def __init__(self, system_message: dict, registry):
+        self.system_message = system_message
+        self.registry = registry
+        self._prefixes = {}
+
+    def prefix(self, model: str, tools: tuple = None, stream: bool = True, temperature: float = None) -> bytes:
+        key = (model, tools, stream, temperature)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            head = {"model": model, "stream": stream}
+            if temperature is not None:
+                head["temperature"] = temperature
+            prefix = dumps(head)[:-1]
+            if tools:
+                prefix += b',"tools":' + self.registry.encoded_schemas(tools) + b',"tool_choice":"auto"'
+            prefix += b',"messages":[' + dumps(self.system_message)
+            self._prefixes[key] = prefix
+        return prefix
+
+    def encode(self, model: str, messages: list, tools: tuple = None, stream: bool = True,
+               temperature: float = None) -> bytes:
+        if not messages or messages[0] != self.system_message:
+            # Нестандартный набор сообщений (например, пересказ истории) — сериализуем целиком
+            body = {"model": model, "stream": stream, "messages": messages}
+            if temperature is not None:
+                body["temperature"] = temperature
+            return dumps(body)
+
+        parts = [self.prefix(model, tools, stream, temperature)]
+        for message in messages[1:]:
+            parts.append(b"," + dumps(message))
+        parts.append(b"]}")
+        return b"".join(parts)
@@ -0,0 +1,164 @@
+"""
+Долгоживущий пул HTTP-соединений для асинхронных запросов JARVIS
+"""
+
+import asyncio
+import contextlib
+import time
+
+import httpx
+
+try:
+    import h2  # noqa: F401  # HTTP/2 доступен только при установленном пакете h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class HttpPool:
+    """Пул соединений поверх httpx.AsyncClient с прогревом и keep-alive пингами"""
+
+    def __init__(self, base_url, headers=None, http2=True, max_connections=10,
+                 keepalive_expiry=120.0, keepalive_interval=30.0, ping_path=None,
+                 timeout=30.0):
+        self.base_url = base_url
+        self.headers = headers or {}
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.keepalive_interval = keepalive_interval
+        self.ping_path = ping_path
+        self.timeout = timeout
+
+        self._client = None
+        self._loop = None
+        self._keepalive_task = None
+        self._last_used = 0.0
+
+        # Статистика пула
+        self._requests = 0
+        self._handshakes = 0
+        self._handshake_time = 0.0
+        self._last_handshake_ms = 0.0
+        self._connect_started = {}
+
+    @property
+    def client(self):
+        """Возвращает клиент, привязанный к текущему event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # Клиент нельзя переносить между event loop'ами — создаём новый
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout
+            )
+            self._loop = loop
+            self._keepalive_task = None
+        return self._client
+
+    async def _trace(self, event_name, info):
+        """Отслеживает установку TCP/TLS соединений через trace-расширение httpcore"""
+        if event_name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            self._connect_started[event_name.rsplit(".", 2)[1]] = time.perf_counter()
+        elif event_name == "connection.connect_tcp.complete":
+            self._handshakes += 1
+            self._add_handshake_time("connect_tcp")
+        elif event_name == "connection.start_tls.complete":
+            self._add_handshake_time("start_tls")
+
+    def _add_handshake_time(self, stage):
+        started = self._connect_started.pop(stage, None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self._handshake_time += elapsed
+        if stage == "connect_tcp":
+            self._last_handshake_ms = elapsed * 1000
+        else:
+            self._last_handshake_ms += elapsed * 1000
+
+    async def request(self, method, url, **kwargs):
+        """Выполняет запрос через общий пул соединений"""
+        extensions = kwargs.pop("extensions", {})
+        extensions.setdefault("trace", self._trace)
+        self._requests += 1
+        self._last_used = time.monotonic()
+        try:
+            return await self.client.request(method, url, extensions=extensions, **kwargs)
+        finally:
+            self._last_used = time.monotonic()
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """Потоковый запрос (например, SSE) через общий пул соединений"""
+        extensions = kwargs.pop("extensions", {})
+        extensions.setdefault("trace", self._trace)
+        self._requests += 1
+        self._last_used = time.monotonic()
+        try:
+            async with self.client.stream(method, url, extensions=extensions, **kwargs) as response:
+                yield response
+        finally:
+            self._last_used = time.monotonic()
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def warm_up(self):
+        """Заранее устанавливает соединение (DNS, TCP, TLS) до первого запроса"""
+        if not self.ping_path:
+            return
+        try:
+            await self.get(self.ping_path)
+        except httpx.HTTPError as e:
+            print(f"Не удалось прогреть соединение с {self.base_url}: {e}")
+
+    def start_keepalive(self):
+        """Запускает фоновые пинги, не дающие простаивающему соединению закрыться"""
+        if not self.ping_path:
+            return
+        self.client  # привязываем клиент к текущему loop
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.get_running_loop().create_task(self._keepalive_loop())
+
+    async def _keepalive_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            if time.monotonic() - self._last_used < self.keepalive_interval:
+                continue
+            try:
+                await self.get(self.ping_path)
+            except httpx.HTTPError:
+                # Соединение переустановится при следующем запросе
+                pass
+
+    async def aclose(self):
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._loop = None
+
+    def stats(self):
+        """Статистика пула: доля переиспользованных соединений и время рукопожатий"""
+        reused = max(self._requests - self._handshakes, 0)
+        return {
+            "http2": self.http2,
+            "requests": self._requests,
+            "handshakes": self._handshakes,
+            "reuse_ratio": reused / self._requests if self._requests else 0.0,
+            "avg_handshake_ms": (self._handshake_time * 1000 / self._handshakes
+                                 if self._handshakes else 0.0),
+            "last_handshake_ms": self._last_handshake_ms,
+        }
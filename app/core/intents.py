@@ -0,0 +1,165 @@
+"""
+Локальный детерминированный разбор простых команд без обращения к LLM
+"""
+
+import difflib
+import re
+
+from app.core.response_cache import content_words, strip_fillers
+
+
+# Русские названия приложений -> исполняемые файлы
+APP_ALIASES = {
+    "калькулятор": "calc",
+    "блокнот": "notepad",
+    "paint": "mspaint",
+    "пэйнт": "mspaint",
+    "паинт": "mspaint",
+    "рисовалку": "mspaint",
+    "проводник": "explorer",
+    "командная строка": "cmd",
+    "командную строку": "cmd",
+    "консоль": "cmd",
+    "терминал": "cmd",
+    "диспетчер задач": "taskmgr",
+    "панель управления": "control",
+    "ворд": "winword",
+    "эксель": "excel",
+    "notepad": "notepad",
+    "calc": "calc",
+    "mspaint": "mspaint",
+    "explorer": "explorer",
+    "cmd": "cmd",
+    "taskmgr": "taskmgr",
+}
+
+NUMBER_WORDS = {
+    "ноль": 0, "один": 1, "одну": 1, "два": 2, "две": 2, "три": 3, "четыре": 4, "пять": 5,
+    "шесть": 6, "семь": 7, "восемь": 8, "девять": 9, "десять": 10, "одиннадцать": 11,
+    "двенадцать": 12, "тринадцать": 13, "четырнадцать": 14, "пятнадцать": 15,
+    "шестнадцать": 16, "семнадцать": 17, "восемнадцать": 18, "девятнадцать": 19,
+    "двадцать": 20, "тридцать": 30, "сорок": 40, "пятьдесят": 50, "шестьдесят": 60,
+    "семьдесят": 70, "восемьдесят": 80, "девяносто": 90, "сто": 100,
+    "половину": 50, "половина": 50, "максимум": 100, "минимум": 0,
+}
+
+# Обращения и вежливые слова, не влияющие на смысл команды
+FILLER = re.compile(r"\b(?:джарвис|jarvis|пожалуйста|please|ка)\b")
+PUNCTUATION = re.compile(r"[^\w\s%]")
+
+OPEN_APP = re.compile(r"^(?:открой|открыть|запусти|запустить)\s+(?P<app>.+)$")
+SET_VOLUME = re.compile(
+    r"^(?:(?:поставь|поставить|сделай|сделать|установи|установить|выставь|выстави)\s+)?"
+    r"(?:громкость|звук)\s+(?:на\s+)?(?P<level>.+?)(?:\s*%|\s+процент\w*)?$"
+)
+EMPTY_RECYCLE_BIN = re.compile(r"^(?:очисти|очистить|почисти|почистить|опустоши|опустошить)\s+корзин\w*$")
+
+# Явная просьба поискать и темы, по которым без свежих данных не ответить
+SEARCH_COMMAND = re.compile(
+    r"^(?:найди|найти|поищи|поискать|загугли|погугли|посмотри|узнай)\s+(?:(?:в|по)\s+(?:интернете|сети|гуглу)\s+)?"
+    r"(?:мне\s+)?(?P<query>.+)$"
+)
+FRESH_INFO = re.compile(
+    r"\b(?:новост\w*|погод\w*|курс\w*\s+(?:доллар|евро|рубл|юан|биткоин)\w*|прогноз\w*|"
+    r"счет\w*\s+матч\w*|котировк\w*)\b"
+)
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    text = PUNCTUATION.sub(" ", text)
+    text = FILLER.sub(" ", text)
+    return " ".join(text.split())
+
+
+def parse_number(text: str):
+    """Разбирает число 0-100, записанное цифрами или словами ("тридцать пять")"""
+    text = text.strip()
+    if text.isdigit():
+        return int(text)
+    total = 0
+    for word in text.split():
+        if word not in NUMBER_WORDS:
+            return None
+        total += NUMBER_WORDS[word]
+    return total if text else None
+
+
+def search_query(text: str):
+    """
+    Поисковый запрос, если реплике заведомо нужны свежие данные из интернета, иначе None.
+    Классификатор намеренно строгий: по нему поиск запускается до ответа модели.
+    """
+    text = normalize(text)
+    match = SEARCH_COMMAND.match(text)
+    if match:
+        return match.group("query")
+    if FRESH_INFO.search(text):
+        return text
+    return None
+
+
+def query_terms(text: str) -> frozenset:
+    """Значимые слова запроса: без команды «найди», слов-паразитов и окончаний — для сравнения формулировок"""
+    text = normalize(text)
+    match = SEARCH_COMMAND.match(text)
+    if match:
+        text = match.group("query")
+    return content_words(strip_fillers(text))
+
+
+class IntentMatch:
+    """
+    Распознанная команда: имя функции, аргументы и уверенность разбора.
+    spoken — аргументы в том виде, в каком их стоит произнести ("калькулятор" вместо "calc").
+    """
+
+    def __init__(self, name: str, arguments: dict, confidence: float, spoken: dict = None):
+        self.name = name
+        self.arguments = arguments
+        self.confidence = confidence
+        self.spoken = spoken or {}
+
+    def __repr__(self):
+        return f"IntentMatch({self.name}, {self.arguments}, {self.confidence:.2f})"
+
+
+class IntentRouter:
+    """Быстрый путь для простых команд: регулярные выражения + нечёткий поиск по названиям приложений"""
+
+    def __init__(self, min_confidence: float = 0.8):
+        self.min_confidence = min_confidence
+
+    def match(self, text: str):
+        """Возвращает IntentMatch, если команда распознана уверенно, иначе None"""
+        text = normalize(text)
+        for matcher in (self._match_open_app, self._match_set_volume, self._match_empty_recycle_bin):
+            intent = matcher(text)
+            if intent is not None and intent.confidence >= self.min_confidence:
+                return intent
+        return None
+
+    def _match_open_app(self, text: str):
+        match = OPEN_APP.match(text)
+        if not match:
+            return None
+        app = match.group("app")
+        candidates = difflib.get_close_matches(app, APP_ALIASES.keys(), n=1, cutoff=0.0)
+        if not candidates:
+            return None
+        alias = candidates[0]
+        confidence = difflib.SequenceMatcher(None, app, alias).ratio()
+        return IntentMatch("open_app", {"app_name": APP_ALIASES[alias]}, confidence, {"app_name": alias})
+
+    def _match_set_volume(self, text: str):
+        match = SET_VOLUME.match(text)
+        if not match:
+            return None
+        level = parse_number(match.group("level"))
+        if level is None or not 0 <= level <= 100:
+            return None
+        return IntentMatch("set_volume", {"level": level}, 1.0)
+
+    def _match_empty_recycle_bin(self, text: str):
+        if not EMPTY_RECYCLE_BIN.match(text):
+            return None
+        return IntentMatch("empty_recycle_bin", {}, 1.0)
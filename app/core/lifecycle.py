@@ -0,0 +1,50 @@
+"""
+Жизненный цикл запросов к Brain: актуален только последний
+"""
+
+import asyncio
+
+from app.core.intents import normalize
+
+
+class RequestLifecycle:
+    """
+    Запросы одного собеседника. Новый запрос отменяет выполняющийся — вместе с его HTTP-потоком,
+    ожиданием функций и записью в историю. Повтор того же текста, пока ответ ещё готовится,
+    присоединяется к нему вместо второго обращения к API.
+    """
+
+    def __init__(self):
+        self.generation = 0
+        self._task = None
+        self._key = None
+        self.stats = {"started": 0, "cancelled": 0, "coalesced": 0}
+
+    async def submit(self, text: str, handler):
+        """
+        handler(generation) — корутина-функция, готовящая ответ.
+        Возвращает задачу ответа: новую или уже выполняющуюся для того же текста.
+        """
+        key = normalize(text)
+        if self.busy():
+            if key == self._key:
+                self.stats["coalesced"] += 1
+                return self._task
+            await self.cancel()
+
+        self.generation += 1
+        self.stats["started"] += 1
+        self._key = key
+        self._task = asyncio.ensure_future(handler(self.generation))
+        return self._task
+
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def cancel(self):
+        """Отменяет текущий запрос и дожидается отката его реплики из истории"""
+        if not self.busy():
+            return
+        self.stats["cancelled"] += 1
+        self._task.cancel()
+        await asyncio.wait({self._task})
@@ -0,0 +1,176 @@
+"""
+Ограниченная по токенам память диалога со скользящим окном и фоновым пересказом
+"""
+
+import json
+import secrets
+
+
+TRUNCATED = "… [сокращено]"
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов (кириллица токенизируется примерно по 3 символа)"""
+    return len(text) // 3 + 1 if text else 0
+
+
+def message_tokens(message: dict) -> int:
+    tokens = 4  # служебные токены роли и разметки
+    tokens += estimate_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        function = tool_call.get("function", {})
+        tokens += estimate_tokens(function.get("name", "")) + estimate_tokens(function.get("arguments", ""))
+    return tokens
+
+
+class ConversationMemory:
+    """
+    История диалога, разбитая на реплики (сообщение пользователя и всё, что за ним следует).
+    Последние реплики идут в запрос целиком, результаты функций в старых репликах урезаются,
+    а реплики, выпавшие из окна, пересказываются в фоне и попадают в запрос как краткое содержание.
+    Результаты функций текущей реплики урезаются по остатку бюджета раньше, чем вытесняются старые реплики.
+    """
+
+    SUMMARY_PROMPT = (
+        "Кратко перескажи разговор ассистента с пользователем: факты, просьбы и договорённости, "
+        "которые могут понадобиться дальше. Не более 5 предложений."
+    )
+
+    def __init__(self, system_prompt: str, max_prompt_tokens: int = 4000, max_turns: int = 6,
+                 tool_payload_chars: int = 600):
+        self.id = secrets.token_hex(8)  # отличает историю, например, в кэше ответов
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_turns = max_turns
+        self.tool_payload_chars = tool_payload_chars
+
+        self.turns = []
+        self.evicted = []  # реплики, выпавшие из окна и ещё не вошедшие в пересказ
+        self.summary = ""
+        self.last_prompt_tokens = 0
+
+    def append(self, message: dict):
+        if message.get("role") == "user" or not self.turns:
+            if self.turns:
+                self._compact_turn(self.turns[-1])
+            self.turns.append([])
+        self.turns[-1].append(message)
+
+        # Скользящее окно: старые реплики уходят на пересказ
+        while len(self.turns) > self.max_turns:
+            self.evicted.append(self.turns.pop(0))
+
+    def discard_turn(self, turn: list):
+        """Убирает реплику из истории (например, отменённый ответ)"""
+        for turns in (self.turns, self.evicted):
+            for index, candidate in enumerate(turns):
+                if candidate is turn:
+                    del turns[index]
+                    return
+
+    def _compact_turn(self, turn: list):
+        """Урезает объёмные результаты функций (например, выдачу web_search) в завершённой реплике"""
+        turn[:] = [self._compact_message(message) for message in turn]
+
+    def _compact_message(self, message: dict, limit: int = None) -> dict:
+        limit = self.tool_payload_chars if limit is None else limit
+        content = message.get("content") or ""
+        if message.get("role") == "tool" and len(content) > limit:
+            return {**message, "content": content[:limit] + TRUNCATED}
+        return message
+
+    def _fit_tool_payloads(self, turn: list, tokens: int) -> list:
+        """
+        Урезает результаты функций реплики так, чтобы вместе они заняли не больше tokens,
+        но не короче, чем в завершённых репликах. Короткие результаты отдают остаток длинным.
+        """
+        tools = sorted(
+            (index for index, message in enumerate(turn) if message.get("role") == "tool"),
+            key=lambda index: len(turn[index].get("content") or "")
+        )
+        if not tools:
+            return turn
+        fitted = list(turn)
+        for number, index in enumerate(tools):
+            share = tokens // (len(tools) - number)
+            # Служебные токены сообщения, округление оценки и пометка о сокращении — тоже из доли
+            limit = max((share - message_tokens({}) - 1) * 3 - len(TRUNCATED), self.tool_payload_chars)
+            fitted[index] = self._compact_message(turn[index], limit)
+            tokens -= message_tokens(fitted[index])
+        return fitted
+
+    def messages(self) -> list:
+        """Собирает сообщения для запроса, укладываясь в бюджет токенов"""
+        messages, kept, self.last_prompt_tokens = self._build(self.turns)
+        # Вытесненные по бюджету реплики уходят на пересказ
+        while len(self.turns) > kept:
+            self.evicted.append(self.turns.pop(0))
+        return messages
+
+    def preview(self, message: dict) -> list:
+        """Сообщения, которые ушли бы в запрос после append(message), — история при этом не меняется"""
+        turns = list(self.turns)
+        if message.get("role") == "user" or not turns:
+            if turns:
+                turns[-1] = [self._compact_message(m) for m in turns[-1]]
+            turns.append([])
+        turns[-1] = turns[-1] + [message]
+        return self._build(turns[-self.max_turns:])[0]
+
+    def _build(self, turns: list) -> tuple:
+        """Возвращает (сообщения, число оставшихся реплик, размер запроса в токенах)"""
+        prefix = [self.system_message]
+        if self.summary:
+            prefix.append({"role": "system", "content": f"Краткое содержание предыдущего разговора: {self.summary}"})
+
+        budget = self.max_prompt_tokens - sum(message_tokens(m) for m in prefix)
+        if turns:
+            # Выдача функций в текущей реплике не должна вытеснять недавний контекст: сначала урезаем её
+            current = turns[-1]
+            fixed = sum(message_tokens(m) for m in current if m.get("role") != "tool")
+            older = sum(message_tokens(m) for turn in turns[:-1] for m in turn)
+            turns = turns[:-1] + [self._fit_tool_payloads(current, budget - older - fixed)]
+        turn_tokens = [sum(message_tokens(m) for m in turn) for turn in turns]
+
+        # Вытесняем самые старые реплики, пока не уложимся (текущая реплика остаётся всегда)
+        start = 0
+        while len(turns) - start > 1 and sum(turn_tokens[start:]) > budget:
+            start += 1
+
+        messages = prefix + [message for turn in turns[start:] for message in turn]
+        tokens = sum(message_tokens(m) for m in prefix) + sum(turn_tokens[start:])
+        return messages, len(turns) - start, tokens
+
+    def needs_summary(self) -> bool:
+        return bool(self.evicted)
+
+    async def summarize(self, complete):
+        """
+        Сворачивает вытесненные реплики в краткое содержание.
+        complete — корутина, принимающая список сообщений и возвращающая текст ответа модели.
+        """
+        if not self.evicted:
+            return
+        pending = list(self.evicted)
+        transcript = "\n".join(
+            f"{message['role']}: {message.get('content') or json.dumps(message.get('tool_calls'), ensure_ascii=False)}"
+            for turn in pending for message in turn
+        )
+        if self.summary:
+            transcript = f"Ранее: {self.summary}\n{transcript}"
+
+        summary = await complete([
+            {"role": "system", "content": self.SUMMARY_PROMPT},
+            {"role": "user", "content": transcript}
+        ])
+        if summary:
+            self.summary = summary.strip()
+            # Пока шёл пересказ, могли вытесниться новые реплики — их оставляем на следующий раз
+            del self.evicted[:len(pending)]
+
+    def stats(self) -> dict:
+        return {
+            "prompt_tokens": self.last_prompt_tokens,
+            "turns": len(self.turns),
+            "pending_summary_turns": len(self.evicted),
+            "summary_tokens": estimate_tokens(self.summary),
+        }
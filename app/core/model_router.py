@@ -0,0 +1,82 @@
+"""
+Выбор модели Mistral под конкретный запрос
+"""
+
+# Ориентировочная стоимость входных токенов, $ за 1M (для выбора между равными по задержке моделями)
+MODEL_COSTS = {
+    "mistral-small-2506": 0.1,
+    "mistral-small-latest": 0.1,
+    "mistral-medium-latest": 0.4,
+    "mistral-large-latest": 2.0,
+    "ministral-8b-latest": 0.1,
+    "ministral-3b-latest": 0.04,
+}
+
+
+class ModelStats:
+    """Наблюдаемая задержка до первого токена (экспоненциальное среднее) и число вызовов"""
+
+    def __init__(self, cost: float, alpha: float = 0.3):
+        self.cost = cost
+        self.alpha = alpha
+        self.latency = None
+        self.calls = 0
+
+    def record(self, seconds: float):
+        self.calls += 1
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = self.alpha * seconds + (1 - self.alpha) * self.latency
+
+
+class ModelRouter:
+    """
+    Болтовня и короткие вопросы идут в быструю модель, запросы с функциями и длинные — в сильную.
+    Итоговый пересказ результатов функций можно отдать отдельной (быстрой) модели.
+    """
+
+    def __init__(self, strong_model: str, fast_model: str, summary_model: str = None,
+                 max_fast_chars: int = 160, cost_weight: float = 0.5):
+        self.strong_model = strong_model
+        self.fast_model = fast_model
+        self.summary_model = summary_model or fast_model
+        self.max_fast_chars = max_fast_chars
+        self.cost_weight = cost_weight
+        self.table = {}
+        for model in {strong_model, fast_model, self.summary_model}:
+            self.table[model] = ModelStats(MODEL_COSTS.get(model, 0.1))
+
+    def choose(self, text: str, tools_needed: bool) -> str:
+        """Модель для первого запроса; tools_needed — были ли отобраны функции для этой реплики"""
+        if tools_needed or len(text) > self.max_fast_chars:
+            return self.strong_model
+        return self._cheapest(self.fast_model, self.strong_model)
+
+    def choose_followup(self, tool_names: list) -> str:
+        """Модель для ответа по результатам функций"""
+        if "web_search" in tool_names:
+            # Пересказ веб-страниц — длинный контекст, оставляем сильную модель, если она не медленнее
+            return self._cheapest(self.strong_model, self.summary_model)
+        return self.summary_model
+
+    def _cheapest(self, preferred: str, alternative: str) -> str:
+        """Предпочитает preferred, пока наблюдаемая задержка и цена alternative не окажутся заметно лучше"""
+        first, second = self.table[preferred], self.table[alternative]
+        if first.latency is None or second.latency is None:
+            return preferred
+        first_score = first.latency * (1 + self.cost_weight * first.cost)
+        second_score = second.latency * (1 + self.cost_weight * second.cost)
+        return alternative if second_score < first_score * 0.8 else preferred
+
+    def record(self, model: str, seconds: float):
+        stats = self.table.get(model)
+        if stats is None:
+            stats = self.table[model] = ModelStats(MODEL_COSTS.get(model, 0.1))
+        stats.record(seconds)
+
+    def stats(self) -> dict:
+        return {
+            model: {"latency_ms": round(s.latency * 1000) if s.latency is not None else None, "calls": s.calls}
+            for model, s in self.table.items()
+        }
@@ -0,0 +1,110 @@
+"""
+Семплирующий профилировщик всех потоков, включаемый на ходу.
+Результат — свёрнутые стеки (folded stacks) для flamegraph.pl, speedscope или inferno.
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from app.core.settings import Settings
+
+
+class SamplingProfiler:
+    """
+    Фоновый поток раз в interval секунд снимает стеки всех потоков (sys._current_frames)
+    и считает одинаковые стеки. Код профилируемых потоков не трогается, накладные расходы —
+    только на сам снимок.
+    """
+
+    def __init__(self, output_dir: str, interval: float = 0.01, max_depth: int = 96):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.sample_count = 0
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._labels = {}
+        atexit.register(self._save_on_exit)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self.running:
+            return
+        self.samples.clear()
+        self.sample_count = 0
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="jarvis-profiler", daemon=True)
+        self._thread.start()
+        print(f"Профилировщик запущен (шаг {self.interval * 1000:.0f} мс)")
+
+    def stop(self) -> str:
+        """Останавливает сбор и сохраняет профиль; возвращает путь к файлу"""
+        if not self.running:
+            return None
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        path = self.save()
+        print(f"Профиль сохранён: {path} ({self.sample_count} снимков)")
+        return path
+
+    def toggle(self) -> str:
+        """Запускает или останавливает профилировщик; при остановке возвращает путь к профилю"""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self.samples[self._collapse(names.get(ident, f"thread-{ident}"), frame)] += 1
+            self.sample_count += 1
+
+    def _collapse(self, thread_name: str, frame) -> str:
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.append(thread_name)
+        stack.reverse()
+        return ";".join(stack)
+
+    def _label(self, code) -> str:
+        # Подписи кэшируются по объекту кода: снимок должен быть дешёвым
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+            )
+        return label
+
+    def save(self, path: str = None) -> str:
+        if path is None:
+            stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+            path = os.path.join(self.output_dir, f"profile-{stamp}.folded")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def _save_on_exit(self):
+        if self.running:
+            self.stop()
+
+
+profiler = SamplingProfiler(os.path.join(Settings().DATA_DIR, "profiles"))
@@ -0,0 +1,218 @@
+"""
+Устойчивость обращений к внешним API: дедлайны, повторы с джиттером, хеджирование и circuit breaker
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+
+import httpx
+
+
+# Статусы, при которых запрос имеет смысл повторить
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ResilienceError(Exception):
+    """Базовая ошибка слоя устойчивости"""
+
+
+class UpstreamError(ResilienceError):
+    """Сервер ответил статусом, который стоит повторить (429/5xx)"""
+
+    def __init__(self, status_code: int, body: str = "", retry_after: float = None):
+        super().__init__(f"HTTP {status_code}: {body[:200]}")
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(ResilienceError):
+    """Запрос не уложился в отведённое время"""
+
+
+class CircuitOpenError(ResilienceError):
+    """API признан недоступным — запросы временно не отправляются"""
+
+
+def retry_after_seconds(response) -> float:
+    value = response.headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LatencyTracker:
+    """Скользящее окно последних задержек для оценки перцентилей"""
+
+    def __init__(self, size: int = 200):
+        self.samples = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class CircuitBreaker:
+    """
+    Размыкается после серии неудач и какое-то время отклоняет запросы сразу.
+    По истечении паузы пропускает один пробный запрос (half-open); если проба завершилась без исхода
+    (отменена или упала не по вине API), release() разрешает следующую пробу.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.state = "closed"
+        self.probing = False  # пробный запрос в half-open ещё выполняется
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.state = "half_open"
+        if self.state == "half_open":
+            # В half-open пропускаем только один пробный запрос
+            if self.probing:
+                return False
+            self.probing = True
+        return True
+
+    def release(self):
+        """Проба закончилась без успеха и без сбоя API — следующий запрос снова будет пробным"""
+        self.probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.state = "closed"
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """Выполняет попытку запроса с дедлайном, повторами, хеджированием и circuit breaker"""
+
+    def __init__(self, deadline: float = 30.0, retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, hedge: bool = False, hedge_percentile: float = 0.95,
+                 hedge_min_samples: int = 20, breaker: CircuitBreaker = None):
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0, "failures": 0}
+
+    async def call(self, attempt, discard=None):
+        """
+        attempt — фабрика корутин, выполняющих одну попытку запроса.
+        discard — корутина-функция для освобождения результата проигравшей хеджированной попытки.
+        """
+        self.stats["calls"] += 1
+        if not self.breaker.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError("Mistral API временно недоступен")
+
+        probe = self.breaker.probing
+        try:
+            return await asyncio.wait_for(self._call_with_retries(attempt, discard), self.deadline)
+        except asyncio.TimeoutError:
+            self.breaker.record_failure()
+            self.stats["failures"] += 1
+            raise DeadlineExceeded(f"Запрос не уложился в {self.deadline} с")
+        finally:
+            # Отмена (вытесненный ответ, упреждающий запрос) и прочие ошибки не говорят о состоянии API
+            if probe and self.breaker.probing:
+                self.breaker.release()
+
+    async def _call_with_retries(self, attempt, discard):
+        for number in range(self.retries + 1):
+            try:
+                result = await self._hedged(attempt, discard)
+                self.breaker.record_success()
+                return result
+            except (UpstreamError, httpx.TransportError) as e:
+                self.breaker.record_failure()
+                if number == self.retries or self.breaker.state == "open":
+                    self.stats["failures"] += 1
+                    raise
+                self.stats["retries"] += 1
+                # Экспоненциальная пауза с полным джиттером; Retry-After от сервера имеет приоритет
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** number))
+                if isinstance(e, UpstreamError) and e.retry_after is not None:
+                    delay = min(e.retry_after, self.backoff_max)
+                print(f"Повтор запроса через {delay:.2f} с: {e}")
+                await asyncio.sleep(delay)
+
+    async def _timed(self, attempt):
+        started = time.perf_counter()
+        result = await attempt()
+        self.latency.record(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, attempt, discard):
+        threshold = None
+        if self.hedge and len(self.latency) >= self.hedge_min_samples:
+            threshold = self.latency.percentile(self.hedge_percentile)
+        first = asyncio.ensure_future(self._timed(attempt))
+        if threshold is None:
+            return await first
+
+        try:
+            done, _ = await asyncio.wait({first}, timeout=threshold)
+        except BaseException:
+            first.cancel()
+            raise
+        if done:
+            return first.result()
+
+        # Первая попытка дольше p95 — отправляем дублирующий запрос и берём тот, что придёт раньше
+        self.stats["hedges"] += 1
+        second = asyncio.ensure_future(self._timed(attempt))
+        pending = {first, second}
+        winner = None
+        error = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task
+            if winner is None:
+                raise error
+            if winner is second:
+                self.stats["hedge_wins"] += 1
+            return winner.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            # Если обе попытки успели завершиться, освобождаем результат проигравшей
+            for task in (first, second):
+                if task is not winner and task.done() and not task.cancelled() \
+                        and task.exception() is None and discard is not None:
+                    await discard(task.result())
@@ -0,0 +1,227 @@
+"""
+Кэш ответов модели: точное совпадение по нормализованному вопросу и поиск похожих вопросов
+"""
+
+import json
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Вопросы, ответ на которые быстро устаревает или зависит от предыдущих реплик
+TIME_SENSITIVE = re.compile(
+    r"\b(?:сейчас|сегодня|завтра|вчера|врем\w*|час\w*|дат\w*|числ\w*|новост\w*|курс\w*|"
+    r"погод\w*|последн\w*|свеж\w*|актуальн\w*)\b"
+)
+CONTEXT_DEPENDENT = re.compile(
+    r"\b(?:это|этот|эта|эти|он|она|оно|они|его|ее|их|тогда|дальше|продолжай|еще|почему|"
+    r"я|меня|мне|мной|мой|моя|мое|мои|моего|моей|моих|моим|мы|нас|нам|наш\w*|"
+    r"предыдущ\w*|прошл\w*|повтор\w*|напомн\w*|снова|опять|раньше|выше|говорил\w*|сказал\w*)\b"
+)
+PUNCTUATION = re.compile(r"[^\w\s]")
+# Числа цифрами и словами (распознавание речи обычно выдаёт словами)
+NUMBERS = re.compile(
+    r"\d+|\b(?:ноль|нол\w|одн\w*|один|два|две|двух|три|трех|четыр\w*|пят\w*|шест\w*|сем\w*|восем\w*|"
+    r"девят\w*|десят\w*|\w+надцат\w*|двадцат\w*|тридцат\w*|сорок\w*|\w+десят\w*|сто|ста|\w+сот\w*|"
+    r"двести|триста|тысяч\w*|миллион\w*|миллиард\w*|половин\w*|полтор\w*)\b"
+)
+# Слова, не меняющие смысла вопроса; остальные должны совпасть, чтобы похожий вопрос считался тем же
+FILLER_WORDS = frozenset((
+    "а", "и", "ну", "же", "ли", "бы", "вот", "так", "пожалуйста", "скажи", "подскажи", "расскажи",
+    "слушай", "джарвис", "кстати", "просто", "у", "в", "во", "на", "о", "об", "про",
+))
+STEM_CHARS = 5  # грубое отсечение окончаний: «музыка» и «музыку» — одно слово
+MIN_SEMANTIC_WORDS = 3  # короткие вопросы сравниваются только точно
+
+
+def normalize(text: str) -> str:
+    text = text.lower().replace("ё", "е")
+    return " ".join(PUNCTUATION.sub(" ", text).split())
+
+
+def strip_fillers(text: str) -> str:
+    return " ".join(word for word in text.split() if word not in FILLER_WORDS)
+
+
+def content_words(text: str) -> frozenset:
+    return frozenset(word[:STEM_CHARS] for word in text.split())
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов с TTL, индексом символьных n-грамм и сохранением на диск.
+    scope отделяет ответы разных историй (сессий API-сервера) друг от друга; такие ответы
+    живут только в памяти — сессии не переживают перезапуск. Файл сохраняется не чаще
+    раза в save_interval секунд и при flush().
+    """
+
+    def __init__(self, path: str, max_entries: int = 256, ttl: float = 24 * 3600,
+                 similarity: float = 0.9, ngram: int = 3, dimensions: int = 2048, save_interval: float = 30.0):
+        self.path = path
+        self.save_interval = save_interval
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.ngram = ngram
+        self.dimensions = dimensions
+
+        self.entries = OrderedDict()  # [область + табуляция +] нормализованный вопрос -> {"answer", "created"}
+        self._matrix = None
+        self._keys = []
+        self._scopes = None
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+        self.load()
+
+    def is_cacheable(self, text: str) -> bool:
+        text = normalize(text)
+        return bool(text) and not TIME_SENSITIVE.search(text) and not CONTEXT_DEPENDENT.search(text)
+
+    @staticmethod
+    def _key(text: str, scope: str = "") -> str:
+        # normalize убирает табуляции из текста, поэтому разделитель однозначен
+        return f"{scope}\t{text}" if scope else text
+
+    @staticmethod
+    def _split(key: str) -> tuple:
+        scope, _, text = key.rpartition("\t")
+        return scope, text
+
+    def get(self, text: str, scope: str = ""):
+        """Возвращает сохранённый ответ или None"""
+        key, exact = self._lookup(text, scope)
+        if key is None:
+            if self.is_cacheable(text):
+                self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        if exact:
+            self.hits += 1
+        else:
+            self.semantic_hits += 1
+        return self.entries[key]["answer"]
+
+    def contains(self, text: str, scope: str = "") -> bool:
+        """Есть ли ответ на вопрос — без учёта в статистике и порядке вытеснения (для упреждающих запросов)"""
+        return self._lookup(text, scope)[0] is not None
+
+    def _lookup(self, text: str, scope: str = "") -> tuple:
+        """(ключ записи, точное ли совпадение) или (None, False)"""
+        if not self.is_cacheable(text):
+            return None, False
+        key = self._key(normalize(text), scope)
+        self._expire()
+        if key in self.entries:
+            return key, True
+        return self._find_similar(normalize(text), scope), False
+
+    def put(self, text: str, answer: str, scope: str = ""):
+        if not answer or not self.is_cacheable(text):
+            return
+        key = self._key(normalize(text), scope)
+        self.entries[key] = {"answer": answer, "created": time.time()}
+        self.entries.move_to_end(key)
+        changed = not scope
+        while len(self.entries) > self.max_entries:
+            evicted, _ = self.entries.popitem(last=False)
+            changed = changed or not self._split(evicted)[0]
+        self._matrix = None
+        if changed:
+            self._changed()
+
+    def _expire(self):
+        deadline = time.time() - self.ttl
+        expired = [key for key, entry in self.entries.items() if entry["created"] < deadline]
+        for key in expired:
+            del self.entries[key]
+        if expired:
+            self._matrix = None
+
+    def _vectorize(self, text: str):
+        """Хэшированный вектор символьных n-грамм, нормированный по длине"""
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        padded = f" {text} "
+        for i in range(len(padded) - self.ngram + 1):
+            gram = padded[i:i + self.ngram].encode("utf-8")
+            vector[zlib.crc32(gram) % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _find_similar(self, text: str, scope: str = ""):
+        # Сравниваются вопросы без слов-паразитов: «скажи, какая столица» и «какая столица» — одно и то же
+        text = strip_fillers(text)
+        words = content_words(text)
+        if np is None or not self.entries or len(words) < MIN_SEMANTIC_WORDS:
+            return None
+        if self._matrix is None:
+            self._keys = list(self.entries)
+            self._scopes = np.array([self._split(k)[0] for k in self._keys], dtype=object)
+            self._matrix = np.stack([self._vectorize(strip_fillers(self._split(k)[1])) for k in self._keys])
+        scores = np.where(self._scopes == scope, self._matrix @ self._vectorize(text), -1.0)
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        candidate = strip_fillers(self._split(self._keys[best])[1])
+        # Похожие по буквам вопросы с другими словами («включи»/«выключи», «кошка»/«собака») — разные вопросы
+        if content_words(candidate) != words:
+            return None
+        # Как и вопросы с разными числами («два плюс два» и «два плюс три»)
+        if NUMBERS.findall(candidate) != NUMBERS.findall(text):
+            return None
+        return self._keys[best]
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = OrderedDict(json.load(f))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить кэш ответов: {e}")
+
+    def _changed(self):
+        """Сохранённые ответы изменились: пишем файл, только если с прошлого сохранения прошло save_interval"""
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def flush(self):
+        """Сохраняет файл, если в нём есть несохранённые изменения"""
+        if self._dirty:
+            self.save()
+
+    def save(self):
+        # Ответы с областью привязаны к сессиям этого процесса — на диск не попадают
+        entries = {key: entry for key, entry in self.entries.items() if not self._split(key)[0]}
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш ответов: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.semantic_hits) / lookups if lookups else 0.0,
+        }
@@ -6,5 +6,33 @@ load_dotenv()
 
 class Settings:
     MISTRAL_API_KEY: str = os.getenv("MISTRAL_API_KEY", "")
+    MISTRAL_API_URL: str = os.getenv("MISTRAL_API_URL", "https://api.mistral.ai")
+    # Сильная модель для запросов с функциями, быстрая — для болтовни и пересказа результатов
+    MISTRAL_MODEL: str = os.getenv("MISTRAL_MODEL", "mistral-small-2506")
+    MISTRAL_FAST_MODEL: str = os.getenv("MISTRAL_FAST_MODEL", "ministral-8b-latest")
+    MISTRAL_SUMMARY_MODEL: str = os.getenv("MISTRAL_SUMMARY_MODEL", "") or None
+    # Время на получение ответа (с учётом повторов) и дублирование запросов дольше p95
+    MISTRAL_DEADLINE: float = float(os.getenv("MISTRAL_DEADLINE", "30"))
+    MISTRAL_HEDGING: bool = os.getenv("MISTRAL_HEDGING", "0") == "1"
     GOOGLE_SEARCH_API_KEY: str = os.getenv("GOOGLE_SEARCH_API_KEY", "")
     GOOGLE_SEARCH_CX: str = os.getenv("GOOGLE_SEARCH_CX", "")
+    GOOGLE_SEARCH_URL: str = os.getenv("GOOGLE_SEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+    # Запускать веб-поиск параллельно с первым запросом к модели, если реплика явно его требует.
+    # Выключено по умолчанию: каждый упреждающий поиск — лишний платный запрос к Google, выигрыш не подтверждён
+    SPECULATIVE_SEARCH: bool = os.getenv("SPECULATIVE_SEARCH", "0") == "1"
+    # Отправлять первый запрос по стабильной промежуточной расшифровке речи, не дожидаясь конца фразы
+    SPECULATIVE_ASR: bool = os.getenv("SPECULATIVE_ASR", "1") == "1"
+    # Каталог для кэшей и прочих данных, переживающих перезапуск
+    DATA_DIR: str = os.getenv("JARVIS_DATA_DIR", os.path.join(os.path.expanduser("~"), ".jarvis"))
+    # Файл трассировки этапов (формат Chrome Trace Event); пустая строка отключает сохранение
+    TRACE_FILE: str = os.getenv("JARVIS_TRACE_FILE", os.path.join(DATA_DIR, "trace.json"))
+    # Локальный API-сервер (main_server.py): адрес, число одновременно готовящихся ответов, сессии
+    SERVER_HOST: str = os.getenv("JARVIS_SERVER_HOST", "127.0.0.1")
+    SERVER_PORT: int = int(os.getenv("JARVIS_SERVER_PORT", "8765"))
+    SERVER_MAX_CONCURRENCY: int = int(os.getenv("JARVIS_SERVER_MAX_CONCURRENCY", "4"))
+    SERVER_MAX_SESSIONS: int = int(os.getenv("JARVIS_SERVER_MAX_SESSIONS", "64"))
+    SERVER_SESSION_TTL: float = float(os.getenv("JARVIS_SERVER_SESSION_TTL", "3600"))
+    # Процессы для разбора загруженных страниц (0 — разбор в потоке, без отдельных процессов)
+    WEB_PARSE_PROCESSES: int = int(os.getenv("JARVIS_PARSE_PROCESSES", str(min(4, max((os.cpu_count() or 2) - 1, 1)))))
+    # Дисковый кэш загруженных страниц, МБ (0 — страницы не кэшируются)
+    PAGE_CACHE_MB: int = int(os.getenv("JARVIS_PAGE_CACHE_MB", "200"))
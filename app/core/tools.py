@@ -0,0 +1,266 @@
+"""
+Декларативный реестр функций, доступных модели
+"""
+
+import contextlib
+import random
+import re
+
+from app.core.codec import dumps
+from app.core.intents import APP_ALIASES
+from app.core.memory import estimate_tokens
+from app.services.system import SystemService
+
+
+WORD = re.compile(r"\w+")
+# Исполняемый файл -> первое русское название для озвучки
+APP_NAMES = {}
+for _alias, _exe in APP_ALIASES.items():
+    APP_NAMES.setdefault(_exe, _alias)
+
+
+class ToolError(Exception):
+    """Функция выполнилась, но не смогла сделать то, что просили"""
+
+
+class ToolSpec:
+    """Описание функции: схема для API, обработчик и таймаут выполнения"""
+
+    def __init__(self, name: str, description: str, parameters: dict, handler, timeout: float,
+                 keywords: tuple = (), replies: tuple = (), spoken=None, always: bool = False):
+        self.name = name
+        self.handler = handler
+        self.timeout = timeout
+        self.keywords = tuple(keywords)
+        self.always = always
+        self.replies = tuple(replies)
+        self.spoken = spoken
+        self._last_reply = None
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": parameters
+            }
+        }
+
+    def render_reply(self, arguments: dict, spoken: dict = None):
+        """
+        Фраза для озвучки результата без второго запроса к модели.
+        None — шаблона нет (или не хватает аргументов), результат должна пересказать модель.
+        """
+        if not self.replies:
+            return None
+        values = dict(arguments)
+        if self.spoken is not None:
+            values.update(self.spoken(arguments))
+        values.update(spoken or {})
+        # Не повторяем одну и ту же фразу дважды подряд
+        choices = [reply for reply in self.replies if reply != self._last_reply] or list(self.replies)
+        template = random.choice(choices)
+        try:
+            reply = template.format(**values)
+        except (KeyError, IndexError):
+            return None
+        self._last_reply = template
+        return reply[:1].upper() + reply[1:]
+
+
+class ToolRegistry:
+    """Функции регистрируются один раз; схемы сериализуются один раз и переиспользуются"""
+
+    def __init__(self):
+        self._tools = {}
+        self._encoded = {}
+        self.savings = {"requests": 0, "tools_sent": 0, "tokens_saved": 0, "last_tokens_saved": 0}
+
+    def tool(self, name: str, description: str, parameters: dict = None, timeout: float = 10,
+             keywords: tuple = (), replies: tuple = (), spoken=None, always: bool = False):
+        """
+        Декоратор регистрации обработчика. Обработчик получает Brain первым аргументом
+        и сообщает о неудаче исключением ToolError.
+        keywords — основы слов, по которым функция считается уместной для реплики.
+        replies — шаблоны ответа для функций с одним лишь побочным эффектом: с ними
+        результат озвучивается локально, без второго запроса к модели.
+        spoken — функция, переводящая аргументы в произносимый вид для шаблонов.
+        always — функция отправляется модели при любой реплике, даже без ключевых слов.
+        """
+        def decorator(handler):
+            self._tools[name] = ToolSpec(
+                name, description, parameters or {"type": "object", "properties": {}}, handler, timeout,
+                keywords, replies, spoken, always
+            )
+            self._encoded.clear()
+            return handler
+        return decorator
+
+    def mentioned(self, text: str) -> tuple:
+        """Функции, к которым есть отсылка в реплике"""
+        words = WORD.findall(text.lower().replace("ё", "е"))
+        return tuple(
+            name for name, spec in self._tools.items()
+            if any(word.startswith(stem) for stem in spec.keywords for word in words)
+        )
+
+    def match(self, text: str) -> tuple:
+        """Упомянутые функции и отправляемые всегда (без учёта в статистике — для упреждающих запросов)"""
+        mentioned = self.mentioned(text)
+        return tuple(name for name, spec in self._tools.items() if spec.always or name in mentioned)
+
+    def select(self, text: str) -> tuple:
+        """Оставляет только функции для реплики (см. match) и учитывает сэкономленные токены"""
+        selected = self.match(text)
+        saved = self.schema_tokens(self.names()) - (self.schema_tokens(selected) if selected else 0)
+        self.savings["requests"] += 1
+        self.savings["tools_sent"] += len(selected)
+        self.savings["tokens_saved"] += saved
+        self.savings["last_tokens_saved"] = saved
+        return selected
+
+    def schema_tokens(self, names: tuple) -> int:
+        return estimate_tokens(self.encoded_schemas(names).decode("utf-8"))
+
+    def get(self, name: str):
+        return self._tools.get(name)
+
+    def names(self) -> tuple:
+        return tuple(self._tools)
+
+    def schemas(self, names: tuple = None) -> list:
+        return [self._tools[name].schema for name in (names or self._tools)]
+
+    def encoded_schemas(self, names: tuple) -> bytes:
+        """Сериализованный JSON-массив схем для заданного набора функций"""
+        encoded = self._encoded.get(names)
+        if encoded is None:
+            encoded = self._encoded[names] = dumps(self.schemas(names))
+        return encoded
+
+
+registry = ToolRegistry()
+
+
+@registry.tool(
+    name="open_app",
+    description="Открыть приложение. Всегда вызывай, если просят что-то открыть.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "app_name": {
+                "type": "string",
+                "description": "Исполняемый файл: notepad, calc, mspaint…"
+            }
+        },
+        "required": ["app_name"]
+    },
+    timeout=5,
+    keywords=("откр", "запус", "приложен", "программ") + tuple(APP_ALIASES),
+    replies=(
+        "Открываю {app_name}, сэр.",
+        "Уже открываю {app_name}.",
+        "Запускаю {app_name}. Постарайтесь не сломать.",
+    ),
+    spoken=lambda args: {"app_name": APP_NAMES.get(args.get("app_name"), args.get("app_name"))}
+)
+def open_app(brain, app_name: str) -> str:
+    result = SystemService.open_app(app_name)
+    print("LLM вызвал функцию:", result)
+    if not result.endswith("успешно открыт."):
+        raise ToolError(result)
+    return f"Приложение {app_name} успешно открыто: {result}"
+
+
+@registry.tool(
+    name="set_volume",
+    description="Установить громкость системы.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "level": {
+                "type": "integer",
+                "description": "Уровень 0-100"
+            }
+        },
+        "required": ["level"]
+    },
+    timeout=5,
+    keywords=("громк", "звук", "тише", "громче", "потише", "погромче", "прибав", "убав", "volume"),
+    replies=(
+        "Громкость {level} процентов, сэр.",
+        "Установил громкость на {level}.",
+        "Громкость {level}. Надеюсь, соседи оценят.",
+    )
+)
+def set_volume(brain, level: int = 50) -> str:
+    result = SystemService.set_volume(level)
+    print("LLM вызвал функцию set_volume:", result)
+    if isinstance(result, str):
+        raise ToolError(result)
+    return f"Громкость установлена: {result}"
+
+
+@registry.tool(
+    name="empty_recycle_bin",
+    description="Очистить корзину (освободить место на диске).",
+    timeout=30,
+    keywords=("корзин", "мусор", "диск"),
+    replies=(
+        "Корзина пуста, сэр.",
+        "Мусор вынесен. Цифровой, разумеется.",
+    )
+)
+def empty_recycle_bin(brain) -> str:
+    result = SystemService.empty_recycle_bin()
+    print("LLM вызвал функцию empty_recycle_bin:", result)
+    if result != "Корзина очищена":
+        raise ToolError(result)
+    return f"Корзина очищена: {result}"
+
+
+@registry.tool(
+    name="web_search",
+    description="Поиск в интернете с чтением найденных страниц: новости, актуальные данные, факты.",
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "Поисковый запрос"
+            },
+            "num_results": {
+                "type": "integer",
+                "description": "Сколько сайтов читать (до 5)",
+                "default": 3
+            }
+        },
+        "required": ["query"]
+    },
+    timeout=25,
+    # Схема короткая, а без неё модель не может поискать то, что не угадали ключевые слова
+    always=True,
+    keywords=("найд", "найти", "поищ", "поиск", "загугл", "гугл", "интернет", "погод", "новост", "курс",
+              "сегодня", "сейчас", "последн", "актуальн", "свеж", "узнай", "цен", "стоимост", "счет")
+)
+async def web_search(brain, query: str = "", num_results: int = 3) -> str:
+    parser = brain.web_parser
+    search_results = []
+    try:
+        urls = await parser.search_urls(query, num_results)
+        # Страницы загружаются параллельно в event loop Brain, быстрые — первыми;
+        # модели хватает трёх (экономия токенов), остальные загрузки отменяются
+        async with contextlib.aclosing(parser.iter_pages(urls)) as pages:
+            async for result in pages:
+                search_results.append(parser.format_result(result))
+                if len(search_results) == 3:
+                    break
+    except Exception as e:
+        content = f"Ошибка при поиске: {str(e)}"
+        print(f"Ошибка web_search: {content}")
+        return content
+
+    # Объединяем результаты в одну строку для передачи модели
+    combined_results = "\n\n".join(search_results)
+    result_summary = f"Найдено {len(search_results)} результатов по запросу '{query}'"
+    print(f"LLM вызвал функцию web_search: {result_summary}")
+    return f"Результаты поиска по запросу '{query}':\n\n{combined_results}"
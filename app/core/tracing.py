@@ -0,0 +1,218 @@
+"""
+Трассировка задержек по этапам реплики: речь -> Brain -> функции -> озвучка.
+Экспорт в формате Chrome Trace Event (открывается в chrome://tracing и ui.perfetto.dev).
+В конце реплики в файл дописываются только новые интервалы — формат JSON Array допускает
+незакрытый массив, поэтому файл не переписывается целиком.
+"""
+
+import contextlib
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from app.core.resilience import LatencyTracker
+
+
+# Реплика, к которой относится текущий код; если не задана — последняя начатая
+_turn = contextvars.ContextVar("jarvis_turn", default=None)
+
+
+class Tracer:
+    """
+    Собирает интервалы (span) с номером реплики и потоком, ведёт скользящие гистограммы
+    по каждому этапу и отмечает вехи реплики (первый токен, первый звук) от её начала.
+    """
+
+    def __init__(self, max_events: int = 20000, window: int = 500):
+        self.events = deque(maxlen=max_events)
+        self.window = window
+        self.histograms = {}
+        self.values = {}  # метрики не-задержки (например, токены в запросе): имя -> последние значения
+        self.counts = {}  # сколько всего замеров было по имени (для инкрементального чтения)
+        self.path = None
+        self._total = 0  # сколько интервалов добавлено за всё время
+        self._flushed = 0  # сколько из них уже дописано в файл
+        self._file = None  # (путь, интервалов в нём) файла, в который дописываем
+        self._named_threads = set()  # потоки, чьи имена уже в файле
+        self._file_lock = threading.Lock()
+        self._turn_ids = itertools.count(1)
+        self._current_turn = None
+        self._turn_started = {}  # номер реплики -> время начала
+        self._milestones = set()  # (номер реплики, веха), уже отмеченные
+        self._threads = {}
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def begin_turn(self) -> int:
+        """Начинает новую реплику (с открытия микрофона; вехи отсчитываются от speech_ended)"""
+        turn = next(self._turn_ids)
+        with self._lock:
+            self._current_turn = turn
+            self._turn_started[turn] = time.perf_counter()
+            # Старые реплики больше не получат вех
+            while len(self._turn_started) > 32:
+                self._turn_started.pop(next(iter(self._turn_started)))
+        _turn.set(turn)
+        return turn
+
+    def speech_ended(self):
+        """
+        Пользователь договорил: первый токен и первый звук реплики отсчитываются от этого момента,
+        а не от открытия микрофона (иначе в них попадают пауза перед фразой и сама фраза)
+        """
+        turn = self.current_turn()
+        with self._lock:
+            if turn in self._turn_started:
+                self._turn_started[turn] = time.perf_counter()
+
+    def end_turn(self):
+        """Реплика отыграна; если задан файл трассировки, в него дописываются новые интервалы"""
+        if self.path:
+            self.flush(self.path)
+
+    def current_turn(self):
+        turn = _turn.get()
+        return turn if turn is not None else self._current_turn
+
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, started, time.perf_counter() - started, args)
+
+    def record(self, name: str, seconds: float, **args):
+        """Интервал, измеренный снаружи (например, задержка до первого токена), заканчивается сейчас"""
+        self._add(name, time.perf_counter() - seconds, seconds, args)
+
+    def value(self, name: str, value: float):
+        """Числовая метрика без времени (размер запроса, доля попаданий и т. п.)"""
+        with self._lock:
+            values = self.values.get(name)
+            if values is None:
+                values = self.values[name] = deque(maxlen=self.window)
+            values.append(value)
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def recent(self, name: str, seen: int) -> tuple:
+        """Замеры name, появившиеся после первых seen; возвращает (всего замеров, новые значения)"""
+        with self._lock:
+            count = self.counts.get(name, 0)
+            samples = self.values.get(name)
+            if samples is None:
+                histogram = self.histograms.get(name)
+                samples = histogram.samples if histogram is not None else ()
+            fresh = min(count - seen, len(samples))
+            return count, list(samples)[len(samples) - fresh:] if fresh > 0 else []
+
+    def names(self) -> list:
+        with self._lock:
+            return list(self.counts)
+
+    def milestone(self, name: str):
+        """Время от начала реплики до первого наступления события name"""
+        turn = self.current_turn()
+        with self._lock:
+            started = self._turn_started.get(turn)
+            if started is None or (turn, name) in self._milestones:
+                return
+            self._milestones.add((turn, name))
+            if len(self._milestones) > 256:
+                self._milestones = {m for m in self._milestones if m[0] in self._turn_started}
+        self._add(name, started, time.perf_counter() - started, {})
+
+    def _add(self, name: str, started: float, seconds: float, args: dict):
+        thread = threading.current_thread()
+        turn = self.current_turn()
+        event = {
+            "name": name,
+            "cat": name.split(".", 1)[0],
+            "ph": "X",
+            "ts": round((started - self._origin) * 1e6),
+            "dur": round(seconds * 1e6),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": {"turn": turn, **args} if args else {"turn": turn},
+        }
+        with self._lock:
+            self.events.append(event)
+            self._threads[thread.ident] = thread.name
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyTracker(self.window)
+            histogram.record(seconds)
+            self.counts[name] = self.counts.get(name, 0) + 1
+            self._total += 1
+
+    def stats(self) -> dict:
+        """p50/p95/p99 по этапам за последние window замеров, в миллисекундах"""
+        with self._lock:
+            histograms = dict(self.histograms)
+        return {
+            name: {
+                "n": len(histogram),
+                "p50_ms": round(histogram.percentile(0.50) * 1000, 1),
+                "p95_ms": round(histogram.percentile(0.95) * 1000, 1),
+                "p99_ms": round(histogram.percentile(0.99) * 1000, 1),
+            }
+            for name, histogram in sorted(histograms.items())
+        }
+
+    def flush(self, path: str):
+        """
+        Дописывает в path интервалы, добавленные с прошлого вызова. Файл начинается заново при первом
+        вызове в процессе и после max_events дописанных интервалов; прежний остаётся рядом как path.1.
+        """
+        with self._file_lock:
+            with self._lock:
+                fresh = min(self._total - self._flushed, len(self.events))
+                events = list(self.events)[len(self.events) - fresh:] if fresh else []
+                self._flushed = self._total
+                threads = dict(self._threads)
+            if not events:
+                return
+            try:
+                if self._file is None or self._file[0] != path or self._file[1] >= self.events.maxlen:
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    if os.path.exists(path):
+                        os.replace(path, f"{path}.1")
+                    with open(path, "w", encoding="utf-8") as f:
+                        f.write("[\n")
+                    self._file = (path, 0)
+                    self._named_threads = set()
+                metadata = [
+                    {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                    for tid, name in threads.items() if tid not in self._named_threads
+                ]
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(event, ensure_ascii=False) + ",\n" for event in metadata + events))
+                self._named_threads.update(threads)
+                self._file = (path, self._file[1] + len(events))
+            except OSError as e:
+                print(f"Не удалось сохранить трассировку: {e}")
+
+    def export(self, path: str):
+        """Сохраняет накопленные интервалы в JSON формата Chrome Trace Event"""
+        with self._lock:
+            events = list(self.events)
+            threads = dict(self._threads)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Не удалось сохранить трассировку: {e}")
+
+
+tracer = Tracer()
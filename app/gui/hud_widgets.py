@@ -7,6 +7,10 @@ from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QPainter, QPen, QColor, QFont, QLinearGradient, QBrush
 import psutil
 import datetime
+import time
+from collections import deque
+
+from app.core.tracing import tracer
 
 
 class HUDPanel(QFrame):
@@ -97,6 +101,135 @@ class HUDPanel(QFrame):
             return "#ff0000"  # Красный
 
 
+class Sparkline(QWidget):
+    """Мини-график последних значений метрики на кольцевом буфере фиксированного размера"""
+
+    def __init__(self, title, unit="мс", scale=1000.0, warning=None, capacity=60, parent=None):
+        super().__init__(parent)
+        self.setFixedHeight(36)
+        self.title = title
+        self.unit = unit
+        self.scale = scale  # множитель для подписи (секунды -> мс и т. п.)
+        self.warning = warning  # порог в единицах подписи, выше которого график красный
+        self.values = deque(maxlen=capacity)
+
+    def add(self, value):
+        self.values.append(value * self.scale)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+
+        width = self.width()
+        height = self.height()
+        last = self.values[-1] if self.values else None
+        alarm = last is not None and self.warning is not None and last > self.warning
+        color = QColor(255, 80, 80) if alarm else QColor(0, 255, 255)
+
+        # Подпись: название и последнее значение
+        painter.setFont(QFont("Courier New", 8))
+        painter.setPen(QColor(128, 212, 255))
+        painter.drawText(0, 10, self.title)
+        painter.setPen(color)
+        text = "---" if last is None else f"{last:.0f} {self.unit}".strip()
+        painter.drawText(0, 0, width, 12, Qt.AlignRight, text)
+
+        # График под подписью, масштаб по максимуму в буфере
+        top, bottom = 14, height - 2
+        painter.setPen(QPen(QColor(0, 150, 255, 80), 1))
+        painter.drawLine(0, bottom, width, bottom)
+        if len(self.values) < 2:
+            return
+        peak = max(self.values) or 1
+        step = width / (self.values.maxlen - 1)
+        offset = self.values.maxlen - len(self.values)
+        painter.setPen(QPen(color, 1.5))
+        previous = None
+        for i, value in enumerate(self.values):
+            x = (offset + i) * step
+            y = bottom - (bottom - top) * value / peak
+            if previous is not None:
+                painter.drawLine(int(previous[0]), int(previous[1]), int(x), int(y))
+            previous = (x, y)
+
+
+class PerformancePanel(QFrame):
+    """Живые метрики самого ассистента: задержки этапов, размер запросов, кэш и отзывчивость GUI"""
+
+    # Заголовок, имя метрики в трассировке (с точкой на конце — все метрики с этим префиксом), единицы,
+    # множитель и порог предупреждения
+    METRICS = (
+        ("ASR", "asr.recognize", "мс", 1000.0, 1500),
+        ("LLM, 1-Й ТОКЕН", "llm.first_token", "мс", 1000.0, 2000),
+        ("ФУНКЦИИ", "tool.", "мс", 1000.0, 3000),
+        ("TTS", "tts.speak", "мс", 1000.0, None),
+        ("ТОКЕНОВ В ЗАПРОСЕ", "llm.request_tokens", "", 1.0, None),
+    )
+    CACHE_WINDOW = 20  # по скольким последним обращениям к кэшу считать долю попаданий
+    FRAME_INTERVAL = 16  # мс, целевой шаг кадра GUI
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("hudPanel")
+        self._seen = {}  # имя метрики -> сколько замеров уже показано
+        self._cache_lookups = deque(maxlen=self.CACHE_WINDOW)
+        self._frame_worst = 0.0
+        self._frame_last = time.perf_counter()
+        self.init_ui()
+
+        self.update_timer = QTimer()
+        self.update_timer.timeout.connect(self.update_metrics)
+        self.update_timer.start(1000)
+
+        # Задержка тиков таймера кадров = время, на которое поток GUI был занят
+        self.frame_timer = QTimer()
+        self.frame_timer.setTimerType(Qt.PreciseTimer)
+        self.frame_timer.timeout.connect(self.on_frame)
+        self.frame_timer.start(self.FRAME_INTERVAL)
+
+    def init_ui(self):
+        layout = QVBoxLayout(self)
+        layout.setSpacing(4)
+
+        self.sparklines = {}
+        for title, name, unit, scale, warning in self.METRICS:
+            self.sparklines[name] = Sparkline(title, unit, scale, warning)
+            layout.addWidget(self.sparklines[name])
+        self.cache_sparkline = Sparkline("КЭШ ОТВЕТОВ", "%", 100.0)
+        self.frame_sparkline = Sparkline("КАДР GUI (ХУДШИЙ)", "мс", 1000.0, 50)
+        layout.addWidget(self.cache_sparkline)
+        layout.addWidget(self.frame_sparkline)
+
+    def on_frame(self):
+        now = time.perf_counter()
+        self._frame_worst = max(self._frame_worst, now - self._frame_last)
+        self._frame_last = now
+
+    def update_metrics(self):
+        names = tracer.names()
+        for _, metric, *_ in self.METRICS:
+            matching = [name for name in names if name.startswith(metric)] if metric.endswith(".") else [metric]
+            for value in self._fresh(matching):
+                self.sparklines[metric].add(value)
+
+        lookups = self._fresh(["cache.hit"])
+        if lookups:
+            self._cache_lookups.extend(lookups)
+            self.cache_sparkline.add(sum(self._cache_lookups) / len(self._cache_lookups))
+
+        self.frame_sparkline.add(self._frame_worst)
+        self._frame_worst = 0.0
+
+    def _fresh(self, names) -> list:
+        """Замеры, появившиеся с прошлого обновления"""
+        values = []
+        for name in names:
+            self._seen[name], fresh = tracer.recent(name, self._seen.get(name, 0))
+            values.extend(fresh)
+        return values
+
+
 class PowerButton(QWidget):
     """Кнопка питания в стиле Джарвиса"""
     
@@ -6,11 +6,15 @@ from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QHBoxLayout, QLabel, QPushButton, QTextEdit, 
                             QFrame, QGraphicsDropShadowEffect, QSplitter, QMenu)
 from PyQt5.QtCore import Qt, QTimer, QThread, pyqtSignal, QPropertyAnimation, QEasingCurve, QRect
-from PyQt5.QtGui import QFont, QPixmap, QPainter, QBrush, QPen, QColor, QLinearGradient
+from PyQt5.QtGui import QFont, QPixmap, QPainter, QBrush, QPen, QColor, QLinearGradient, QTextCursor
 import speech_recognition as sr
 from app.core.brain import Brain
-from app.services.speak import SpeakService
-from app.gui.hud_widgets import HUDPanel, PowerButton, VoiceVisualizerWidget
+from app.core.lifecycle import RequestLifecycle
+from app.core.profiler import profiler
+from app.core.tracing import tracer
+from app.services.listen import StreamingRecognizer
+from app.services.speak import SentenceBuffer, SpeakService, SpeechQueue
+from app.gui.hud_widgets import HUDPanel, PerformancePanel, PowerButton, VoiceVisualizerWidget
 from app.gui.demo_features import JarvisDemoFeatures
 
 
@@ -100,19 +104,24 @@ class AnimatedCircle(QWidget):
 class SpeechThread(QThread):
     """Поток для обработки речи"""
     text_recognized = pyqtSignal(str)
+    partial_recognized = pyqtSignal(str)
     error_occurred = pyqtSignal(str)
     
     def __init__(self):
         super().__init__()
-        self.recognizer = sr.Recognizer()
+        self.recognizer = StreamingRecognizer()
         self.is_running = False
         
     def run(self):
+        threading.current_thread().name = "SpeechThread"
         self.is_running = True
+        # Реплика начинается с записи речи, вехи отсчитываются от конца фразы (StreamingRecognizer.listen)
+        tracer.begin_turn()
         with sr.Microphone() as source:
             try:
-                audio = self.recognizer.listen(source, timeout=5, phrase_time_limit=10)
-                text = self.recognizer.recognize_google(audio, language="ru-RU")
+                # Стабильные промежуточные расшифровки уходят в Brain, пока фраза ещё звучит
+                text = self.recognizer.listen(source, on_partial=self.partial_recognized.emit,
+                                              timeout=5, phrase_time_limit=10)
                 self.text_recognized.emit(text)
             except sr.UnknownValueError:
                 self.error_occurred.emit("Не удалось распознать речь")
@@ -123,34 +132,146 @@ class SpeechThread(QThread):
         self.is_running = False
 
 
-class BrainThread(QThread):
-    """Поток для обработки запросов к ИИ"""
-    response_ready = pyqtSignal(str)
+class BrainWorker(QThread):
+    """
+    Постоянный поток с одним event loop и одним Brain; запросы принимаются через очередь.
+    Новый запрос отменяет недоговорённый ответ; токены и ответы помечены номером запроса.
+    """
+    request_started = pyqtSignal(int)
+    token_ready = pyqtSignal(int, str)
+    response_ready = pyqtSignal(int, str)
     error_occurred = pyqtSignal(str)
     
-    def __init__(self, text):
+    def __init__(self, idle_timeout=5.0):
         super().__init__()
-        self.text = text
-        self.brain = Brain()
+        self.idle_timeout = idle_timeout
+        self.brain = None
+        self.lifecycle = RequestLifecycle()
+        self.loop = None
+        self.requests = None
+        self.compaction = None
+        self.loop_ready = threading.Event()
         
     def run(self):
+        threading.current_thread().name = "BrainWorker"
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.requests = asyncio.Queue()
+        self.loop_ready.set()
         try:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            response = loop.run_until_complete(self.brain.get_answer(user_input=self.text))
-            self.response_ready.emit(response)
-            loop.close()
+            self.loop.run_until_complete(self.serve())
+        finally:
+            self.loop.close()
+
+    async def serve(self):
+        """Обрабатывает запросы по очереди; в простое сворачивает старую историю"""
+        try:
+            # Brain создаётся один раз: пул соединений, парсер и история живут всю сессию
+            self.brain = Brain()
+            await self.brain.warm_up()
+        except Exception as e:
+            self.error_occurred.emit(f"Ошибка инициализации: {str(e)}")
+
+        while True:
+            try:
+                text = await asyncio.wait_for(self.requests.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                # Пересказ идёт в фоне: очередь продолжает читаться, новый запрос его прерывает
+                if self.brain is not None and not self.lifecycle.busy() and (
+                        self.compaction is None or self.compaction.done()):
+                    self.compaction = asyncio.ensure_future(self.compact_history())
+                continue
+            self.cancel_compaction()
+            if text is None:
+                break
+            if self.brain is None:
+                self.error_occurred.emit("Ядро JARVIS не инициализировано")
+                continue
+
+            # Устаревший ответ отменяется, повтор того же запроса присоединяется к текущему
+            await self.lifecycle.submit(text, lambda generation, text=text: self.answer(generation, text))
+
+        await self.lifecycle.cancel()
+        if self.brain is not None:
+            await self.brain.close()
+
+    async def compact_history(self):
+        try:
+            await self.brain.compact_history()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка сворачивания истории: {e}")
+
+    def cancel_compaction(self):
+        """Прерванный пересказ ничего не теряет: вытесненные реплики дождутся следующего простоя"""
+        if self.compaction is not None:
+            self.compaction.cancel()
+            self.compaction = None
+
+    async def answer(self, generation, text):
+        self.request_started.emit(generation)
+        try:
+            response = await self.stream_answer(generation, text)
+            self.response_ready.emit(generation, response)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             self.error_occurred.emit(f"Ошибка обработки: {str(e)}")
 
+    async def stream_answer(self, generation, text):
+        """Передаёт токены в GUI по мере генерации и возвращает полный ответ"""
+        tokens = []
+        async for token in self.brain.stream_answer(user_input=text):
+            tokens.append(token)
+            self.token_ready.emit(generation, token)
+        return "".join(tokens)
+
+    def submit(self, text):
+        """Ставит запрос в очередь (вызывается из потока GUI)"""
+        self.loop_ready.wait()
+        self.loop.call_soon_threadsafe(self.requests.put_nowait, text)
+
+    def prefetch(self, partial_text):
+        """Упреждающий запрос по промежуточной расшифровке (вызывается из потока GUI)"""
+        self.loop_ready.wait()
+        self.loop.call_soon_threadsafe(self._prefetch, partial_text)
+
+    def _prefetch(self, partial_text):
+        if self.brain is not None:
+            self.brain.prefetch(partial_text)
+
+    def discard_prefetch(self, *_):
+        """Прослушивание закончилось без итоговой расшифровки (вызывается из потока GUI)"""
+        self.loop_ready.wait()
+        self.loop.call_soon_threadsafe(self._discard_prefetch)
+
+    def _discard_prefetch(self):
+        if self.brain is not None:
+            self.brain.discard_prefetch()
+
+    def stop(self):
+        if self.isRunning():
+            self.submit(None)
+            self.wait(3000)
+
 
 class JarvisGUI(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.brain = Brain()
         self.speak_service = SpeakService()
         self.speech_thread = None
-        self.brain_thread = None
+        self.brain_worker = BrainWorker()
+        self.brain_worker.request_started.connect(self.on_request_started)
+        self.brain_worker.token_ready.connect(self.on_token_ready)
+        self.brain_worker.response_ready.connect(self.on_response_ready)
+        self.brain_worker.error_occurred.connect(self.on_brain_error)
+        self.brain_worker.start()
+        self.speech_queue = None  # очередь, в которую ещё дописывается ответ
+        self.playing_queue = None  # очередь, которую озвучивает поток speak, — до его завершения
+        self.speak_thread = None
+        self.sentence_buffer = SentenceBuffer()
+        self.current_generation = 0
         self.demo_features = JarvisDemoFeatures(self)
         
         self.init_ui()
@@ -217,6 +338,11 @@ class JarvisGUI(QMainWindow):
         easter_action = context_menu.addAction("🥚 Секретное меню")
         easter_action.triggered.connect(self.demo_features.show_easter_egg)
         
+        profiler_action = context_menu.addAction(
+            "⏹ Остановить профилировщик" if profiler.running else "⏺ Запустить профилировщик"
+        )
+        profiler_action.triggered.connect(self.toggle_profiler)
+        
         context_menu.addSeparator()
         
         # Выход
@@ -252,6 +378,14 @@ class JarvisGUI(QMainWindow):
         
         context_menu.exec_(self.mapToGlobal(position))
     
+    def toggle_profiler(self):
+        """Включает/выключает семплирующий профилировщик всех потоков"""
+        path = profiler.toggle()
+        if path:
+            self.add_to_chat("Система", f"Профиль сохранён: {path}")
+        else:
+            self.add_to_chat("Система", "Профилировщик запущен. Повторите пункт меню, чтобы сохранить профиль.")
+    
     def confirm_exit(self):
         """Подтверждение выхода из приложения"""
         from PyQt5.QtWidgets import QMessageBox
@@ -312,8 +446,7 @@ class JarvisGUI(QMainWindow):
             # Останавливаем все активные потоки
             if self.speech_thread and self.speech_thread.isRunning():
                 self.speech_thread.terminate()
-            if self.brain_thread and self.brain_thread.isRunning():
-                self.brain_thread.terminate()
+            self.brain_worker.stop()
                 
             # Короткая задержка для отображения сообщения
             QTimer.singleShot(1500, self.close)
@@ -380,8 +513,7 @@ class JarvisGUI(QMainWindow):
             # Останавливаем потоки
             if self.speech_thread and self.speech_thread.isRunning():
                 self.speech_thread.terminate()
-            if self.brain_thread and self.brain_thread.isRunning():
-                self.brain_thread.terminate()
+            self.brain_worker.stop()
                 
             event.accept()
         else:
@@ -453,9 +585,12 @@ class JarvisGUI(QMainWindow):
         
         # HUD панель
         self.hud_panel = HUDPanel()
+        self.performance_panel = PerformancePanel()
         
         right_layout.addWidget(QLabel("СИСТЕМА"))
         right_layout.addWidget(self.hud_panel)
+        right_layout.addWidget(QLabel("ПРОИЗВОДИТЕЛЬНОСТЬ"))
+        right_layout.addWidget(self.performance_panel)
         right_layout.addStretch()
         
         splitter.addWidget(right_widget)
@@ -705,6 +840,8 @@ class JarvisGUI(QMainWindow):
         
         self.speech_thread = SpeechThread()
         self.speech_thread.text_recognized.connect(self.on_text_recognized)
+        self.speech_thread.partial_recognized.connect(self.brain_worker.prefetch)
+        self.speech_thread.error_occurred.connect(self.brain_worker.discard_prefetch)
         self.speech_thread.error_occurred.connect(self.on_speech_error)
         self.speech_thread.finished.connect(self.on_listening_finished)
         self.speech_thread.start()
@@ -712,6 +849,7 @@ class JarvisGUI(QMainWindow):
     def stop_listening(self):
         if self.speech_thread and self.speech_thread.isRunning():
             self.speech_thread.terminate()
+            self.brain_worker.discard_prefetch()
         self.on_listening_finished()
     
     def on_listening_finished(self):
@@ -727,47 +865,117 @@ class JarvisGUI(QMainWindow):
         
         self.jarvis_circle.start_speaking_animation()
         
-        self.brain_thread = BrainThread(text)
-        self.brain_thread.response_ready.connect(self.on_response_ready)
-        self.brain_thread.error_occurred.connect(self.on_brain_error)
-        self.brain_thread.start()
+        self.brain_worker.submit(text)
     
-    def on_response_ready(self, response):
+    def on_request_started(self, generation):
+        # Озвучивается только последний ответ: недоговорённый прежний замолкает, даже если уже получен целиком
+        if self.playing_queue is not None:
+            self.playing_queue.cancel()
+            self.playing_queue = None
+        self.speech_queue = None
+        self.current_generation = generation
+
+    def on_token_ready(self, generation, token):
+        if generation != self.current_generation:
+            return
+        if self.speech_queue is None:
+            # Первый токен: открываем реплику в чате и запускаем потоковую озвучку
+            self.add_to_chat("JARVIS", "")
+            self.status_label.setText("Озвучиваю ответ...")
+            self.sentence_buffer = SentenceBuffer()
+            self.speech_queue = self.playing_queue = SpeechQueue()
+            self.start_speaking(self.speak_stream, self.speech_queue, generation)
+        
+        cursor = self.chat_display.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(token)
+        self.chat_display.verticalScrollBar().setValue(
+            self.chat_display.verticalScrollBar().maximum()
+        )
+        
+        # Законченные предложения озвучиваем сразу, не дожидаясь конца ответа
+        for sentence in self.sentence_buffer.feed(token):
+            self.speech_queue.put(sentence)
+    
+    def on_response_ready(self, generation, response):
+        if generation != self.current_generation:
+            return
+        if self.speech_queue is not None:
+            # Ответ уже выведен и озвучивается по мере генерации
+            rest = self.sentence_buffer.flush()
+            if rest:
+                self.speech_queue.put(rest)
+            self.speech_queue.put(None)
+            self.speech_queue = None
+            return
+        
         self.add_to_chat("JARVIS", response)
         self.status_label.setText("Озвучиваю ответ...")
         
         # Запуск озвучки в отдельном потоке
-        speak_thread = threading.Thread(target=self.speak_response, args=(response,))
-        speak_thread.daemon = True
-        speak_thread.start()
+        self.start_speaking(self.speak_response, response, generation)
+
+    def start_speaking(self, target, source, generation):
+        """Озвучка в отдельном потоке; прерванный ответ договаривает текущее предложение — ждём его"""
+        previous = self.speak_thread
+        self.speak_thread = threading.Thread(target=target, args=(source, generation, previous), name="speak")
+        self.speak_thread.daemon = True
+        self.speak_thread.start()
     
-    def speak_response(self, response):
+    def speak_stream(self, sentences, generation, previous=None):
         try:
+            if previous is not None:
+                previous.join()
+            self.speak_service.speak_queue(sentences)
+        except Exception as e:
+            print(f"Ошибка озвучки: {e}")
+        finally:
+            # Возвращаемся в главный поток для обновления UI
+            QTimer.singleShot(0, lambda: self.on_speaking_finished(generation))
+    
+    def speak_response(self, response, generation, previous=None):
+        try:
+            if previous is not None:
+                previous.join()
             self.speak_service.speak(response)
         except Exception as e:
             print(f"Ошибка озвучки: {e}")
         finally:
             # Возвращаемся в главный поток для обновления UI
-            QTimer.singleShot(0, self.on_speaking_finished)
+            QTimer.singleShot(0, lambda: self.on_speaking_finished(generation))
     
-    def on_speaking_finished(self):
+    def on_speaking_finished(self, generation):
+        # Слушать снова начинает только поток последнего ответа, прерванные просто завершаются
+        if generation != self.current_generation:
+            return
+        self.playing_queue = None
+        tracer.end_turn()
         self.jarvis_circle.stop_animation()
         self.status_label.setText("Готов к работе")
         self.start_listening()
     
     def on_speech_error(self, error):
+        tracer.end_turn()
         self.add_to_chat("Система", f"Ошибка распознавания: {error}")
         self.on_listening_finished()
     
     def on_brain_error(self, error):
+        if self.speech_queue is not None:
+            self.speech_queue.put(None)
+            self.speech_queue = None
+        tracer.end_turn()
         self.add_to_chat("Система", f"Ошибка обработки: {error}")
         self.jarvis_circle.stop_animation()
         self.status_label.setText("Готов к работе")
 
 
-def main():
+def main(profile=False):
     app = QApplication(sys.argv)
     
+    # Профиль с самого запуска; сохраняется при остановке из меню или при выходе
+    if profile:
+        profiler.start()
+    
     # Установка темной темы
     app.setStyle('Fusion')
     
@@ -0,0 +1,346 @@
+"""
+Локальный API-сервер: один прогретый Brain на несколько клиентов (GUI, консоль, другие компьютеры).
+У каждой сессии своя история и свой жизненный цикл запросов; пул соединений с Mistral общий.
+
+HTTP:
+  POST   /v1/sessions                     — новая сессия со случайным id
+  POST   /v1/sessions/{id}/messages       — {"text": ..., "stream": true}; ответ потоком SSE или JSON
+  GET    /v1/sessions/{id}                — история и размер запроса сессии
+  DELETE /v1/sessions/{id}                — отменить ответ и забыть историю
+  GET    /v1/stats                        — сессии, очередь, пул соединений, задержки этапов
+WebSocket /v1/ws:
+  -> {"session": id, "text": ...} или {"session": id, "cancel": true}
+  <- {"type": "token", ...}, затем {"type": "done" | "cancelled" | "error", ...}
+"""
+
+import asyncio
+import secrets
+import time
+
+try:
+    from aiohttp import WSMsgType, web
+except ImportError:
+    web = None
+
+from app.core.brain import Brain
+from app.core.codec import dumps, loads
+from app.core.lifecycle import RequestLifecycle
+from app.core.settings import Settings
+from app.core.tracing import tracer
+
+
+class Reply:
+    """
+    Токены одного ответа. Читать их могут несколько клиентов: повтор того же вопроса
+    присоединяется к готовящемуся ответу и получает его с начала.
+    """
+
+    def __init__(self):
+        self.generation = None
+        self.tokens = []
+        self.status = None  # None — готовится, затем "done", "cancelled" или "error"
+        self.error = None
+        self._changed = asyncio.Event()
+
+    def push(self, token: str):
+        self.tokens.append(token)
+        self._notify()
+
+    def finish(self, status: str, error: str = None):
+        if self.status is None:
+            self.status = status
+            self.error = error
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def stream(self):
+        """Все токены ответа — уже полученные и новые, пока ответ не завершится"""
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.tokens):
+                yield self.tokens[sent]
+                sent += 1
+            if self.status is not None:
+                return
+            await changed.wait()
+
+    def summary(self) -> dict:
+        summary = {"type": self.status, "generation": self.generation, "text": "".join(self.tokens)}
+        if self.error:
+            summary["error"] = self.error
+        return summary
+
+
+class Session:
+    """История одного собеседника и его запросы: новый вопрос отменяет устаревший ответ"""
+
+    def __init__(self, session_id: str, memory):
+        self.id = session_id
+        self.memory = memory
+        self.lifecycle = RequestLifecycle()
+        self.last_active = time.monotonic()
+        self._task = None
+        self._reply = None
+
+    async def ask(self, text: str, produce) -> Reply:
+        """produce(session, text, reply) — корутина, заполняющая ответ"""
+        self.last_active = time.monotonic()
+        reply = Reply()
+        task = await self.lifecycle.submit(text, lambda generation: produce(self, text, reply))
+        if task is not self._task:
+            reply.generation = self.lifecycle.generation
+            self._task, self._reply = task, reply
+            # Задачу могут отменить до первого шага корутины — тогда produce не выполнится вовсе,
+            # и ответ завершается здесь, иначе его клиенты ждали бы вечно
+            task.add_done_callback(lambda done: reply.finish("cancelled" if done.cancelled() else "error"))
+        return self._reply
+
+    def busy(self) -> bool:
+        return self.lifecycle.busy()
+
+
+class BrainServer:
+    """HTTP/WebSocket-доступ к одному Brain с ограничением числа одновременно готовящихся ответов"""
+
+    JANITOR_INTERVAL = 30.0  # с, как часто сворачивать историю и забывать простаивающие сессии
+    MAX_SESSION_ID = 64
+
+    def __init__(self, brain: Brain = None, host: str = None, port: int = None, max_concurrency: int = None,
+                 max_sessions: int = None, session_ttl: float = None):
+        self.brain = brain
+        self.host = host or Settings().SERVER_HOST
+        self.port = Settings().SERVER_PORT if port is None else port
+        self.max_concurrency = max_concurrency or Settings().SERVER_MAX_CONCURRENCY
+        self.max_sessions = max_sessions or Settings().SERVER_MAX_SESSIONS
+        self.session_ttl = session_ttl or Settings().SERVER_SESSION_TTL
+        self.sessions = {}
+        self.stats = {"requests": 0, "active": 0, "waiting": 0, "sessions_expired": 0}
+        self._limit = None
+        self._runner = None
+        self._janitor = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        if web is None:
+            raise RuntimeError("Для API-сервера нужен aiohttp: pip install aiohttp")
+        if self.brain is None:
+            self.brain = Brain()
+        await self.brain.warm_up()
+        self._limit = asyncio.Semaphore(self.max_concurrency)
+
+        app = web.Application()
+        app.router.add_post("/v1/sessions", self._create_session)
+        app.router.add_post("/v1/sessions/{session}/messages", self._post_message)
+        app.router.add_get("/v1/sessions/{session}", self._get_session)
+        app.router.add_delete("/v1/sessions/{session}", self._delete_session)
+        app.router.add_get("/v1/stats", self._get_stats)
+        app.router.add_get("/v1/ws", self._websocket)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Порт 0 — выбирает система
+        self.port = self._runner.addresses[0][1]
+        self._janitor = asyncio.ensure_future(self._sweep())
+        return self.base_url
+
+    async def close(self):
+        if self._janitor is not None:
+            self._janitor.cancel()
+        for session in list(self.sessions.values()):
+            await session.lifecycle.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+        if self.brain is not None:
+            await self.brain.close()
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"JARVIS API: {self.base_url} (одновременно ответов: {self.max_concurrency})")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.close()
+
+    # --- Сессии ---
+
+    def session(self, session_id: str) -> Session:
+        """Сессия по id, создаётся при первом обращении; при переполнении вытесняется самая давняя свободная"""
+        if not session_id or len(session_id) > self.MAX_SESSION_ID:
+            raise web.HTTPBadRequest(text="некорректный id сессии")
+        session = self.sessions.get(session_id)
+        if session is None:
+            if len(self.sessions) >= self.max_sessions:
+                idle = [s for s in self.sessions.values() if not s.busy()]
+                if not idle:
+                    raise web.HTTPServiceUnavailable(text="слишком много сессий")
+                del self.sessions[min(idle, key=lambda s: s.last_active).id]
+            session = self.sessions[session_id] = Session(session_id, self.brain.new_memory())
+        return session
+
+    async def _produce(self, session: Session, text: str, reply: Reply):
+        """Готовит ответ в истории сессии; одновременно — не больше max_concurrency ответов"""
+        self.stats["requests"] += 1
+        self.stats["waiting"] += 1
+        waiting = True
+        try:
+            async with self._limit:
+                self.stats["waiting"] -= 1
+                waiting = False
+                self.stats["active"] += 1
+                try:
+                    tracer.begin_turn()
+                    async for token in self.brain.stream_answer(text, session.memory):
+                        reply.push(token)
+                finally:
+                    self.stats["active"] -= 1
+            reply.finish("done")
+            tracer.end_turn()
+        except asyncio.CancelledError:
+            reply.finish("cancelled")
+            raise
+        except Exception as e:
+            print(f"Ошибка ответа в сессии {session.id}: {e}")
+            reply.finish("error", str(e))
+        finally:
+            if waiting:
+                self.stats["waiting"] -= 1
+        return "".join(reply.tokens)
+
+    async def _sweep(self):
+        """В простое сворачивает старую историю сессий и забывает давно молчащие"""
+        while True:
+            await asyncio.sleep(self.JANITOR_INTERVAL)
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if session.busy():
+                    continue
+                if now - session.last_active > self.session_ttl:
+                    self.sessions.pop(session.id, None)
+                    self.stats["sessions_expired"] += 1
+                    continue
+                try:
+                    await self.brain.compact_history(session.memory)
+                except Exception as e:
+                    print(f"Ошибка сворачивания истории сессии {session.id}: {e}")
+
+    # --- HTTP ---
+
+    async def _create_session(self, request):
+        session = self.session(secrets.token_hex(8))
+        return self._json({"session": session.id}, status=201)
+
+    async def _post_message(self, request):
+        session = self.session(request.match_info["session"])
+        try:
+            payload = loads(await request.read())
+            text = (payload.get("text") or "").strip()
+        except (ValueError, AttributeError):
+            raise web.HTTPBadRequest(text="ожидается JSON вида {\"text\": ...}")
+        if not text:
+            raise web.HTTPBadRequest(text="пустой текст")
+
+        reply = await session.ask(text, self._produce)
+        if not payload.get("stream", True):
+            async for _ in reply.stream():
+                pass
+            return self._json({"session": session.id, **reply.summary()})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        async for token in reply.stream():
+            await response.write(self._event({"type": "token", "token": token}))
+        await response.write(self._event({"session": session.id, **reply.summary()}))
+        await response.write_eof()
+        return response
+
+    async def _get_session(self, request):
+        session = self.sessions.get(request.match_info["session"])
+        if session is None:
+            raise web.HTTPNotFound(text="нет такой сессии")
+        return self._json({
+            "session": session.id,
+            "busy": session.busy(),
+            "summary": session.memory.summary,
+            "messages": [message for turn in session.memory.turns for message in turn],
+            "stats": session.memory.stats(),
+            "requests": session.lifecycle.stats,
+        })
+
+    async def _delete_session(self, request):
+        session = self.sessions.pop(request.match_info["session"], None)
+        if session is None:
+            raise web.HTTPNotFound(text="нет такой сессии")
+        await session.lifecycle.cancel()
+        return web.Response(status=204)
+
+    async def _get_stats(self, request):
+        return self._json({
+            "sessions": len(self.sessions),
+            "max_concurrency": self.max_concurrency,
+            **self.stats,
+            "pool": self.brain.pool_stats(),
+            "response_cache": self.brain.response_cache.stats(),
+            "trace": tracer.stats(),
+        })
+
+    # --- WebSocket ---
+
+    async def _websocket(self, request):
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        relays = set()
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    payload = loads(message.data)
+                    session = self.session(payload["session"])
+                except (ValueError, KeyError, TypeError) as e:
+                    await ws.send_str(self._text({"type": "error", "error": f"некорректное сообщение: {e}"}))
+                    continue
+                except web.HTTPException as e:
+                    await ws.send_str(self._text({"type": "error", "error": e.text}))
+                    continue
+
+                if payload.get("cancel"):
+                    await session.lifecycle.cancel()
+                    continue
+                text = (payload.get("text") or "").strip()
+                if text:
+                    relay = asyncio.ensure_future(self._relay(ws, session, text))
+                    relays.add(relay)
+                    relay.add_done_callback(relays.discard)
+        finally:
+            # Клиент ушёл: ответы дописываются в историю сессии, но больше никуда не пересылаются
+            for relay in relays:
+                relay.cancel()
+        return ws
+
+    async def _relay(self, ws, session: Session, text: str):
+        reply = await session.ask(text, self._produce)
+        header = {"session": session.id, "generation": reply.generation}
+        async for token in reply.stream():
+            await ws.send_str(self._text({"type": "token", **header, "token": token}))
+        await ws.send_str(self._text({"session": session.id, **reply.summary()}))
+
+    @staticmethod
+    def _text(payload: dict) -> str:
+        return dumps(payload).decode("utf-8")
+
+    @staticmethod
+    def _event(payload: dict) -> bytes:
+        return b"data: " + dumps(payload) + b"\n\n"
+
+    @staticmethod
+    def _json(payload: dict, status: int = 200):
+        return web.Response(body=dumps(payload), status=status, content_type="application/json")
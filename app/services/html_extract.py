@@ -0,0 +1,332 @@
+"""
+Однопроходное извлечение текста из HTML: блоки текста без повторов, основной контент и метаданные <head>.
+
+Разбор управляется событиями start(tag, attrs) / end(tag) / data(text) / close() — тем же интерфейсом,
+что у target-парсеров lxml, — поэтому дерево документа не строится и каждый символ обрабатывается один раз.
+Источник событий выбирается из установленных: selectolax (lexbor), lxml (libxml2) или html.parser
+из стандартной библиотеки (тот же, что BeautifulSoup использовал в 'html.parser').
+"""
+
+import os
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from bs4.dammit import UnicodeDammit
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+# Границы блоков текста: текст внутри блока (кроме вложенных блоков) становится одним абзацем
+BLOCK_TAGS = frozenset((
+    "address", "article", "aside", "blockquote", "body", "caption", "dd", "details", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hr", "html", "li", "main", "nav", "ol", "p", "pre", "section", "summary", "table", "tbody", "td",
+    "tfoot", "th", "thead", "tr", "ul",
+))
+# Поддеревья, текст которых в контент не идёт
+SKIP_TAGS = frozenset((
+    "script", "style", "nav", "header", "footer", "aside", "advertisement", "noscript", "template", "textarea",
+))
+# Элементы без закрывающего тега
+VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+    "track", "wbr",
+))
+# Открытый <p> неявно закрывается началом этих элементов
+CLOSES_P = BLOCK_TAGS - {"body", "html", "td", "th", "tr", "tbody", "thead", "tfoot", "caption"}
+# Кандидаты в основной контент по убыванию приоритета: (тег, атрибут, значение); последний — <body>
+CONTENT_SELECTORS = (
+    ("article", None, None),
+    (None, "role", "main"),
+    (None, "class", "content"),
+    (None, "class", "main-content"),
+    (None, "class", "post-content"),
+    (None, "class", "entry-content"),
+    (None, "id", "content"),
+    (None, "class", "article-body"),
+    ("body", None, None),
+)
+# Метаданные из <meta name=...> и <meta property=...>
+META_NAMES = {"description": "description", "keywords": "keywords"}
+META_PROPERTIES = {"og:title": "og_title", "og:description": "og_description"}
+MIN_BLOCK_CHARS = 20  # более короткие блоки (подписи кнопок, даты) в контент не идут
+
+
+def matches(selector: tuple, tag: str, attrs: dict) -> bool:
+    name, attribute, value = selector
+    if name is not None:
+        return tag == name
+    actual = attrs.get(attribute)
+    if actual is None:
+        return False
+    return value in actual.split() if attribute == "class" else actual == value
+
+
+class HtmlExtractor:
+    """
+    Приёмник событий разбора. Текст копится до ближайшей границы блока и выдаётся абзацем один раз,
+    поэтому вложенные <div> не повторяют текст потомков. Абзацы, попавшие внутрь кандидатов в основной
+    контент, запоминаются для каждого кандидата; в close() выбирается первый найденный по приоритету.
+    Несбалансированную разметку (незакрытые <p>, лишние закрывающие теги) события могут содержать —
+    стек тегов восстанавливается так же, как это делают браузеры в простых случаях.
+    """
+
+    def __init__(self, extract_links=False, base_url=""):
+        self.extract_links = extract_links
+        self.base_url = base_url
+        self.blocks = []
+        self.links = []
+        self.metadata = {"title": None, "description": "", "keywords": ""}
+
+        self._stack = []
+        self._skip_depth = None  # глубина стека, с которой начался пропускаемый элемент
+        self._pending = []
+        self._title = None  # текст первого <title>, пока он открыт
+        self._link = None  # (адрес, текст) открытой ссылки
+        self._region_depth = [None] * len(CONTENT_SELECTORS)
+        self._region_found = [False] * len(CONTENT_SELECTORS)
+        self._regions = [[] for _ in CONTENT_SELECTORS]
+
+    # --- События ---
+
+    def start(self, tag, attrs):
+        tag = tag.lower()
+        if tag in CLOSES_P:
+            self._close_open_p()
+        if tag == "li":
+            self._close_implied("li", ("ul", "ol"))
+        elif tag in ("td", "th"):
+            self._close_implied("td", ("tr", "table"))
+            self._close_implied("th", ("tr", "table"))
+        elif tag == "tr":
+            self._close_implied("tr", ("table", "tbody", "thead", "tfoot"))
+
+        if self._skip_depth is None:
+            if tag in BLOCK_TAGS:
+                self._flush()
+            if tag == "br":
+                self._pending.append(" ")
+            elif tag == "meta":
+                self._meta(attrs)
+            elif tag == "title" and self.metadata["title"] is None and self._title is None:
+                self._title = []
+        # Ссылки собираются со всей страницы, в том числе из навигации
+        if tag == "a" and self.extract_links:
+            if self._link is not None:
+                self._add_link()  # вложенная ссылка закрывает предыдущую
+            if attrs.get("href"):
+                self._link = (attrs["href"], [])
+        if tag in VOID_TAGS:
+            return
+
+        self._stack.append(tag)
+        depth = len(self._stack)
+        if self._skip_depth is None and tag in SKIP_TAGS:
+            self._skip_depth = depth
+        for index, selector in enumerate(CONTENT_SELECTORS):
+            if not self._region_found[index] and matches(selector, tag, attrs):
+                self._region_found[index] = True
+                self._region_depth[index] = depth
+
+    def end(self, tag):
+        tag = tag.lower()
+        if tag not in self._stack:
+            return  # лишний закрывающий тег
+        while self._stack:
+            if self._pop() == tag:
+                break
+
+    def data(self, text):
+        if self._link is not None:
+            self._link[1].append(text)
+        if self._skip_depth is not None:
+            return
+        if self._title is not None:
+            self._title.append(text)
+            return
+        self._pending.append(text)
+
+    def close(self) -> dict:
+        """Закрывает незакрытые элементы; возвращает {'metadata', 'content', 'links'}"""
+        while self._stack:
+            self._pop()
+        self._flush()
+        if self.metadata["title"] is None:
+            self.metadata["title"] = "Без заголовка"
+
+        # Первый найденный кандидат по приоритету, иначе весь документ
+        content = self.blocks
+        for index, found in enumerate(self._region_found):
+            if found:
+                content = self._regions[index]
+                break
+        return {"metadata": self.metadata, "content": " ".join(content), "links": self.links}
+
+    # --- Внутреннее ---
+
+    def _pop(self) -> str:
+        tag = self._stack[-1]
+        depth = len(self._stack)
+        if tag in BLOCK_TAGS or depth in self._region_depth:
+            self._flush()
+        if tag == "title" and self._title is not None:
+            self.metadata["title"] = " ".join("".join(self._title).split())
+            self._title = None
+        elif tag == "a" and self._link is not None:
+            self._add_link()
+        if self._skip_depth == depth:
+            self._skip_depth = None
+        for index, region_depth in enumerate(self._region_depth):
+            if region_depth == depth:
+                self._region_depth[index] = None
+        self._stack.pop()
+        return tag
+
+    def _close_open_p(self):
+        # <p> закрывается следующим блоком, но не через границу ячейки или списка
+        for tag in reversed(self._stack):
+            if tag == "p":
+                self.end("p")
+                return
+            if tag in ("div", "li", "td", "th", "table", "body", "blockquote", "section", "article"):
+                return
+
+    def _close_implied(self, tag: str, scope: tuple):
+        for open_tag in reversed(self._stack):
+            if open_tag == tag:
+                self.end(tag)
+                return
+            if open_tag in scope:
+                return
+
+    def _flush(self):
+        if not self._pending:
+            return
+        text = " ".join("".join(self._pending).split())
+        self._pending.clear()
+        if len(text) <= MIN_BLOCK_CHARS:
+            return
+        self.blocks.append(text)
+        for index, depth in enumerate(self._region_depth):
+            if depth is not None:
+                self._regions[index].append(text)
+
+    def _meta(self, attrs: dict):
+        content = attrs.get("content", "")
+        key = META_NAMES.get((attrs.get("name") or "").lower())
+        if key is not None:
+            if not self.metadata[key]:
+                self.metadata[key] = content
+            return
+        key = META_PROPERTIES.get((attrs.get("property") or "").lower())
+        if key is not None:
+            self.metadata.setdefault(key, content)
+
+    def _add_link(self):
+        href, text = self._link
+        self._link = None
+        text = " ".join("".join(text).split())
+        if text:
+            self.links.append({"url": urljoin(self.base_url, href), "text": text})
+
+
+class _EventSource(HTMLParser):
+    """Переводит вызовы html.parser в события HtmlExtractor"""
+
+    def __init__(self, target: HtmlExtractor):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, {name: value or "" for name, value in attrs})
+        if tag not in VOID_TAGS:
+            self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+
+def _feed_stdlib(text: str, target: HtmlExtractor) -> dict:
+    source = _EventSource(target)
+    source.feed(text)
+    source.close()
+    return target.close()
+
+
+def _feed_lxml(text: str, target: HtmlExtractor) -> dict:
+    # libxml2 сам восстанавливает структуру; события приходят сбалансированными
+    parser = etree.HTMLParser(target=target, no_network=True)
+    parser.feed(text)
+    return parser.close()
+
+
+def _feed_selectolax(text: str, target: HtmlExtractor) -> dict:
+    # lexbor строит дерево по HTML5 на C; обходим его без рекурсии, выдавая те же события
+    node = LexborHTMLParser(text).root
+    while node is not None:
+        tag = node.tag
+        if tag == "-text":
+            target.data(node.text_content)
+        elif not tag.startswith("-") and not tag.startswith("_"):
+            target.start(tag, {name: value or "" for name, value in node.attributes.items()})
+            if node.child is not None:
+                node = node.child
+                continue
+            target.end(tag)
+        # Поднимаемся, закрывая элементы, пока не найдётся следующий сосед
+        while node is not None and node.next is None:
+            node = node.parent
+            if node is not None and node.tag not in ("-undef", "-document"):
+                target.end(node.tag)
+        if node is not None:
+            node = node.next
+    return target.close()
+
+
+# Источники событий по убыванию скорости; используется первый установленный
+BACKENDS = {
+    "selectolax": _feed_selectolax if LexborHTMLParser is not None else None,
+    "lxml": _feed_lxml if etree is not None else None,
+    "html.parser": _feed_stdlib,
+}
+
+
+def available_backends() -> list:
+    return [name for name, feed in BACKENDS.items() if feed is not None]
+
+
+def default_backend() -> str:
+    """JARVIS_HTML_PARSER, если задан и установлен, иначе самый быстрый из установленных"""
+    preferred = os.getenv("JARVIS_HTML_PARSER", "")
+    available = available_backends()
+    return preferred if preferred in available else available[0]
+
+
+def decode_html(markup, encoding=None) -> str:
+    """Текст страницы: кодировка из заголовка ответа, затем <meta charset>, затем угадывание"""
+    if isinstance(markup, str):
+        return markup
+    return UnicodeDammit(markup, [encoding] if encoding else [], is_html=True).unicode_markup or ""
+
+
+def extract(markup, extract_links=False, base_url="", encoding=None, backend=None) -> dict:
+    """Метаданные, основной контент и (по запросу) ссылки страницы за один проход"""
+    feed = BACKENDS.get(backend or default_backend())
+    if feed is None:
+        raise ValueError(f"Парсер HTML недоступен: {backend}")
+    # Декодирование общее для всех парсеров, чтобы результат не зависел от их угадывания кодировки
+    return feed(decode_html(markup, encoding), HtmlExtractor(extract_links, base_url))
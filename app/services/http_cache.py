@@ -0,0 +1,333 @@
+"""
+Дисковый кэш загруженных страниц: сырое тело ответа и извлечённый из него текст по канонизированному адресу.
+Свежесть — по Cache-Control / Expires / Last-Modified, устаревшие записи перепроверяются условным GET
+(If-None-Match / If-Modified-Since), объём ограничен с вытеснением давно не использованных (LRU).
+"""
+
+import email.utils
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from app.core.codec import dumps, loads
+
+
+# Параметры, не влияющие на содержимое страницы
+TRACKING_PARAMS = re.compile(r"^(?:utm_\w+|fbclid|gclid|yclid|mc_cid|mc_eid|_openstat|ref_src)$")
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonical_url(url: str) -> str:
+    """Один адрес для одной страницы: регистр схемы и хоста, порт по умолчанию, порядок и метки в query, #якорь"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not TRACKING_PARAMS.match(name))
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+def parse_http_date(value):
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp() if value else None
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def cache_control(headers) -> dict:
+    directives = {}
+    for part in headers.get("cache-control", "").split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = value.strip('"')
+    return directives
+
+
+class HttpCache:
+    """
+    Индекс (адрес, размер, срок свежести, валидаторы) хранится в index.json, тела и извлечённый текст —
+    в отдельных файлах. Попадание в свежую запись не требует ни сети, ни разбора.
+    Методы, читающие и пишущие файлы, вызываются из пула потоков; индекс сохраняется не чаще
+    раза в save_interval секунд и при flush().
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 200 * 2 ** 20, default_ttl: float = 300.0,
+                 max_heuristic_ttl: float = 24 * 3600, save_interval: float = 30.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl  # свежесть ответа без заголовков кэширования
+        self.max_heuristic_ttl = max_heuristic_ttl
+        self.index_path = os.path.join(directory, "index.json")
+        self.save_interval = save_interval
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+        self.entries = OrderedDict()  # ключ -> запись индекса, от давно использованных к недавним
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "stale": 0, "revalidated": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self._lock = threading.Lock()  # поиск из event loop Brain и из синхронных вызовов в других потоках
+
+        self.load()
+
+    # --- Поиск ---
+
+    def lookup(self, url: str):
+        """Запись для адреса (копия с полями key и fresh) или None"""
+        key = self._key(url)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            fresh = not entry["no_cache"] and time.time() < entry["expires"]
+            self.stats["hits" if fresh else "stale"] += 1
+            return {**entry, "key": key, "fresh": fresh}
+
+    def validators(self, entry) -> dict:
+        """Заголовки условного запроса для устаревшей записи"""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def load_body(self, entry):
+        return self._read(entry["key"], ".body")
+
+    def load_extracted(self, entry, extract_links: bool = False):
+        """Извлечённый текст, если он сохранён (со ссылками, если они нужны)"""
+        if entry.get("extracted") is None or (extract_links and not entry["extracted"]):
+            return None
+        data = self._read(entry["key"], ".json")
+        return loads(data) if data is not None else None
+
+    # --- Запись ---
+
+    def store(self, url: str, response, body: bytes):
+        """Сохраняет ответ 200, если заголовки это разрешают; возвращает запись или None"""
+        if response.status_code != 200:
+            return None
+        freshness = self._freshness(response.headers)
+        if freshness is None:
+            return None
+        expires, no_cache = freshness
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if no_cache and not etag and not last_modified:
+            return None  # перепроверять нечем — хранить незачем
+
+        key = self._key(url)
+        if not self._write(key, ".body", body):
+            return None
+        entry = {
+            "url": url,
+            "status": response.status_code,
+            "encoding": response.charset_encoding,
+            "etag": etag,
+            "last_modified": last_modified,
+            "expires": expires,
+            "no_cache": no_cache,
+            "body_bytes": len(body),
+            "extracted_bytes": 0,
+            "extracted": None,  # None — текст не сохранён, False — без ссылок, True — со ссылками
+        }
+        with self._lock:
+            self._forget(key, remove_files=False)
+            self.entries[key] = entry
+            self.total_bytes += len(body)
+            self.stats["stored"] += 1
+            self._evict()
+        self._changed()
+        return {**entry, "key": key, "fresh": True}
+
+    def store_extracted(self, entry, extracted: dict, extract_links: bool = False):
+        data = dumps(extracted)
+        if not self._write(entry["key"], ".json", data):
+            return
+        with self._lock:
+            current = self.entries.get(entry["key"])
+            if current is None:
+                return
+            self.total_bytes += len(data) - current["extracted_bytes"]
+            current["extracted_bytes"] = len(data)
+            current["extracted"] = extract_links
+            self._evict()
+        self._changed()
+
+    def revalidated(self, entry, response):
+        """Сервер ответил 304: тело прежнее, обновляются срок свежести и валидаторы"""
+        freshness = self._freshness(response.headers)
+        with self._lock:
+            current = self.entries.get(entry["key"])
+            if current is None:
+                return
+            self.stats["revalidated"] += 1
+            if freshness is None:
+                self._forget(entry["key"])
+                self._dirty = True
+                return
+            current["expires"], current["no_cache"] = freshness
+            current["etag"] = response.headers.get("etag") or current["etag"]
+            current["last_modified"] = response.headers.get("last-modified") or current["last_modified"]
+        self._changed()
+
+    # --- Свежесть ---
+
+    def _freshness(self, headers):
+        """(момент, до которого ответ свежий, нужна ли перепроверка каждый раз) или None, если хранить нельзя"""
+        directives = cache_control(headers)
+        if "no-store" in directives or headers.get("vary", "").strip() == "*":
+            return None
+        now = time.time()
+        age = self._seconds(headers.get("age")) or 0
+        no_cache = "no-cache" in directives
+
+        max_age = self._seconds(directives.get("max-age"))
+        if max_age is not None:
+            return now + max_age - age, no_cache
+        expires = parse_http_date(headers.get("expires"))
+        if expires is not None or headers.get("expires"):
+            # Некорректный Expires (например, "0") означает «уже устарел»
+            date = parse_http_date(headers.get("date")) or now
+            return now + (expires - date if expires is not None else 0) - age, no_cache
+
+        # Эвристика: 10% возраста страницы по Last-Modified, иначе время по умолчанию
+        last_modified = parse_http_date(headers.get("last-modified"))
+        if last_modified is not None:
+            date = parse_http_date(headers.get("date")) or now
+            return now + min(max(date - last_modified, 0) * 0.1, self.max_heuristic_ttl), no_cache
+        return now + self.default_ttl, no_cache
+
+    @staticmethod
+    def _seconds(value):
+        try:
+            return max(int(value), 0) if value is not None else None
+        except ValueError:
+            return None
+
+    # --- Файлы и вытеснение ---
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(canonical_url(url).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _read(self, key: str, suffix: str):
+        try:
+            with open(self._path(key, suffix), "rb") as f:
+                return f.read()
+        except OSError:
+            # Файл удалили снаружи — запись больше не годится
+            with self._lock:
+                self._forget(key)
+            return None
+
+    def _write(self, key: str, suffix: str, data: bytes) -> bool:
+        path = self._path(key, suffix)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            print(f"Не удалось сохранить страницу в кэш: {e}")
+            return False
+
+    def _forget(self, key: str, remove_files: bool = True):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        self._dirty = True
+        self.total_bytes -= entry["body_bytes"] + entry["extracted_bytes"]
+        if remove_files:
+            for suffix in (".body", ".json"):
+                try:
+                    os.remove(self._path(key, suffix))
+                except OSError:
+                    pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            self._forget(next(iter(self.entries)))
+            self.stats["evicted"] += 1
+
+    # --- Индекс ---
+
+    def load(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                self.entries = OrderedDict(loads(f.read()))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить кэш страниц: {e}")
+        self.total_bytes = sum(entry["body_bytes"] + entry["extracted_bytes"] for entry in self.entries.values())
+        self._remove_orphans()
+
+    def _remove_orphans(self):
+        """Удаляет файлы, которых нет в индексе (индекс не успели сохранить), — иначе они копятся вне лимита"""
+        try:
+            subdirs = [name for name in os.listdir(self.directory)
+                       if len(name) == 2 and os.path.isdir(os.path.join(self.directory, name))]
+        except OSError:
+            return
+        for subdir in subdirs:
+            path = os.path.join(self.directory, subdir)
+            for name in os.listdir(path):
+                key, _, suffix = name.partition(".")
+                if key in self.entries and suffix in ("body", "json"):
+                    continue
+                try:
+                    os.remove(os.path.join(path, name))
+                except OSError:
+                    pass
+
+    def _changed(self):
+        """Индекс изменился: сохраняем, только если с прошлого сохранения прошло save_interval"""
+        with self._lock:
+            self._dirty = True
+            due = time.monotonic() - self._saved_at >= self.save_interval
+        if due:
+            self.save()
+
+    def flush(self):
+        """Сохраняет индекс, если в нём есть несохранённые изменения"""
+        if self._dirty:
+            self.save()
+
+    def save(self):
+        with self._lock:
+            data = dumps(self.entries)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f"{self.index_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"Не удалось сохранить кэш страниц: {e}")
+
+    def summary(self) -> dict:
+        # Перепроверенная (304) страница тоже не загружается и не разбирается заново
+        lookups = self.stats["hits"] + self.stats["stale"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "entries": len(self.entries),
+            "megabytes": round(self.total_bytes / 2 ** 20, 1),
+            "hit_rate": (self.stats["hits"] + self.stats["revalidated"]) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,74 @@
+"""
+Распознавание речи с промежуточными расшифровками во время фразы
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import speech_recognition as sr
+
+from app.core.tracing import tracer
+
+
+class StreamingRecognizer:
+    """
+    Слушает фразу кусками и периодически распознаёт накопленное аудио.
+    Стабильная промежуточная расшифровка (дважды подряд одинаковая) передаётся в on_partial,
+    чтобы ответ начал готовиться ещё до конца фразы.
+    """
+
+    def __init__(self, recognizer: sr.Recognizer = None, language: str = "ru-RU", interval: float = 1.0):
+        self.recognizer = recognizer or sr.Recognizer()
+        self.language = language
+        self.interval = interval
+        # Промежуточное распознавание не должно задерживать итоговое — отдельный фоновый поток
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr-partial")
+
+    def listen(self, source, on_partial=None, timeout=None, phrase_time_limit=None) -> str:
+        """Возвращает итоговую расшифровку; исключения speech_recognition пробрасываются как есть"""
+        with tracer.span("asr.capture"):
+            frames = self._capture(source, on_partial, timeout, phrase_time_limit)
+        tracer.speech_ended()
+        audio = sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+        with tracer.span("asr.recognize", audio_bytes=len(audio.frame_data)):
+            return self.recognizer.recognize_google(audio, language=self.language)
+
+    def _capture(self, source, on_partial, timeout, phrase_time_limit) -> list:
+        """Записывает фразу до паузы, попутно распознавая накопленное аудио; возвращает кадры"""
+        frames = []
+        audio_seconds = 0.0
+        submitted_at = 0.0
+        pending = None
+        previous = None
+        emitted = None
+
+        for chunk in self.recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit,
+                                            stream=True):
+            frames.append(chunk.get_raw_data())
+            audio_seconds += len(frames[-1]) / (source.SAMPLE_RATE * source.SAMPLE_WIDTH)
+            if on_partial is None:
+                continue
+
+            if pending is not None and pending.done():
+                partial = pending.result()
+                pending = None
+                if partial and partial == previous and partial != emitted:
+                    emitted = partial
+                    on_partial(partial)
+                previous = partial
+
+            # Распознавание накопленного аудио идёт в фоне, по одному запросу за раз
+            if pending is None and audio_seconds - submitted_at >= self.interval:
+                submitted_at = audio_seconds
+                audio = sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH)
+                pending = self._pool.submit(self._recognize_partial, audio)
+
+        if pending is not None:
+            pending.cancel()
+        return frames
+
+    def _recognize_partial(self, audio) -> str:
+        try:
+            with tracer.span("asr.partial"):
+                return self.recognizer.recognize_google(audio, language=self.language)
+        except (sr.UnknownValueError, sr.RequestError):
+            return None
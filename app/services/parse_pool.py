@@ -0,0 +1,67 @@
+"""
+Пул процессов для разбора страниц: разбор не держит GIL потока GUI и event loop Brain,
+а страницы одного поиска разбираются параллельно на разных ядрах.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.services.html_extract import default_backend, extract
+
+
+def _extract_record(markup: bytes, encoding, extract_links: bool, base_url: str) -> dict:
+    """Выполняется в процессе пула: на входе сырые байты страницы, на выходе только извлечённый текст"""
+    return extract(markup, extract_links, base_url, encoding)
+
+
+def _warm() -> str:
+    # Импорт модулей и первый разбор (прогрев парсера) в каждом процессе
+    extract(b"<html><head><title>warm</title></head><body><p>warm up the parser backend</p></body></html>")
+    return default_backend()
+
+
+class ParsePool:
+    """
+    Процессы запускаются через spawn: fork процесса с потоками Qt и event loop небезопасен.
+    Если пул сломался (процесс упал), он пересоздаётся при следующем разборе.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        self.stats = {"parsed": 0, "restarts": 0}
+        self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def warm_up(self):
+        """Поднимает все процессы заранее, чтобы первый поиск не ждал их запуска"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        backends = await asyncio.gather(*(loop.run_in_executor(executor, _warm) for _ in range(self.processes)))
+        print(f"Пул разбора страниц: {self.processes} процессов, парсер {backends[0]}")
+
+    async def extract(self, markup: bytes, encoding=None, extract_links=False, base_url="") -> dict:
+        loop = asyncio.get_running_loop()
+        try:
+            record = await loop.run_in_executor(
+                self._get_executor(), _extract_record, markup, encoding, extract_links, base_url
+            )
+        except BrokenProcessPool:
+            # Упавший процесс не должен ронять поиск: эту страницу разбираем в потоке, пул пересоздадим
+            self.stats["restarts"] += 1
+            self.shutdown()
+            record = await loop.run_in_executor(None, _extract_record, markup, encoding, extract_links, base_url)
+        self.stats["parsed"] += 1
+        return record
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
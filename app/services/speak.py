@@ -1,4 +1,57 @@
-import pyttsx3
+import queue
+import re
+
+from app.core.tracing import tracer
+
+try:
+    import pyttsx3
+except ImportError:
+    pyttsx3 = None
+
+
+# Конец предложения: знак препинания (и закрывающие кавычки/скобки), за которым идёт пробел
+SENTENCE_END = re.compile(r'[.!?…]+["»)\]]*\s+|\n+')
+
+
+class SentenceBuffer:
+    """Накапливает токены потока и отдаёт законченные предложения"""
+
+    def __init__(self, min_length: int = 2):
+        self.min_length = min_length
+        self.buffer = ""
+
+    def feed(self, token: str) -> list:
+        self.buffer += token
+        sentences = []
+        start = 0
+        for match in SENTENCE_END.finditer(self.buffer):
+            sentence = self.buffer[start:match.end()].strip()
+            if len(sentence) >= self.min_length:
+                sentences.append(sentence)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        """Возвращает остаток текста, не закрытый знаком препинания"""
+        rest = self.buffer.strip()
+        self.buffer = ""
+        return rest
+
+
+class SpeechQueue(queue.Queue):
+    """Очередь предложений одного ответа; отменённый ответ больше ничего не отдаёт на озвучку"""
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = False
+
+    def cancel(self):
+        """Выбрасывает неозвученные предложения и завершает озвучку после текущего"""
+        self.cancelled = True
+        with self.mutex:
+            self.queue.clear()
+        self.put(None)
 
 
 class SpeakService:
@@ -6,6 +59,12 @@ class SpeakService:
         pass
 
     def speak(self, text: str):
+        # Время от начала реплики до первого звука — главный показатель отзывчивости
+        tracer.milestone("turn.first_audio")
+        with tracer.span("tts.speak", chars=len(text)):
+            self._speak(text)
+
+    def _speak(self, text: str):
         try:
             engine = pyttsx3.init()
             engine.setProperty("rate", 225)      # скорость речи
@@ -20,3 +79,11 @@ class SpeakService:
             print(f"Ошибка озвучки: {e}")
             # Fallback на gTTS если pyttsx3 не работает
             self._fallback_speak(text)
+
+    def speak_queue(self, sentences):
+        """Озвучивает предложения из очереди по мере поступления, пока не придёт None"""
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                break
+            self.speak(sentence)
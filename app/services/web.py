@@ -1,20 +1,90 @@
+import asyncio
+import contextlib
 import requests
-from bs4 import BeautifulSoup
-import time
+import httpx
 import logging
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from app.core.http_pool import HttpPool
+from app.core.resilience import RETRYABLE_STATUSES, retry_after_seconds
+from app.core.tracing import tracer
+from app.services.html_extract import extract
+from app.services.http_cache import HttpCache
+from app.services.parse_pool import ParsePool
 
 
+class PageFetcher:
+    """
+    Параллельная загрузка страниц в одном event loop: общий предел одновременных запросов,
+    а к каждому сайту — не больше per_host запросов сразу и не чаще одного старта за interval секунд.
+    """
+
+    def __init__(self, headers, timeout=10, max_concurrency=8, per_host=2, interval=1.0, retries=1):
+        self.pool = HttpPool(base_url="", headers=headers, max_connections=max_concurrency, timeout=timeout)
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.interval = interval
+        self.retries = retries
+        self._slots = None
+        self._hosts = {}  # хост -> (семафор, время, раньше которого новый запрос не начинается)
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, host):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if host not in self._hosts:
+            self._hosts[host] = [asyncio.Semaphore(self.per_host), 0.0]
+        state = self._hosts[host]
+        async with state[0]:
+            loop = asyncio.get_running_loop()
+            # Очередь к сайту занимается до ожидания, чтобы параллельные запросы шли друг за другом
+            start = max(loop.time(), state[1])
+            previous, state[1] = state[1], start + self.interval
+            try:
+                await asyncio.sleep(start - loop.time())
+                async with self._slots:
+                    yield
+            except asyncio.CancelledError:
+                # Отменённый запрос (например, ненужный упреждающий поиск) не задерживает следующие к сайту,
+                # если после него очередь никто не занял
+                if state[1] == start + self.interval:
+                    state[1] = previous
+                raise
+
+    async def fetch(self, url, headers=None):
+        """
+        GET с учётом ограничений; на 429/5xx — повтор после Retry-After (не дольше interval * 4).
+        headers — дополнительные заголовки (условный запрос); ответ 304 ошибкой не считается.
+        """
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            async with self._slot(host):
+                with tracer.span("web.fetch", host=host):
+                    response = await self.pool.get(url, follow_redirects=True, headers=headers)
+            if response.status_code not in RETRYABLE_STATUSES or attempt == self.retries:
+                break
+            await asyncio.sleep(min(retry_after_seconds(response) or self.interval, self.interval * 4))
+        if response.status_code != 304:
+            response.raise_for_status()
+        return response
+
+    async def aclose(self):
+        await self.pool.aclose()
+
 
 class WebPageParser:
-    def __init__(self, delay=1, timeout=10, api_key=None, cx=None):
+    def __init__(self, delay=1, timeout=10, api_key=None, cx=None,
+                 search_url="https://www.googleapis.com/customsearch/v1", max_concurrency=8, per_host=2,
+                 parse_processes=0, cache_dir=None, cache_mb=200):
         self.session = requests.Session()
-        self.delay = delay
+        self.delay = delay  # пауза между запросами к одному сайту, с
         self.timeout = timeout
         self.api_key = api_key
         self.cx = cx
+        self.search_url = search_url
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
         
         # Настройка retry стратегии
         retry_strategy = Retry(
@@ -36,76 +106,33 @@ class WebPageParser:
             'Upgrade-Insecure-Requests': '1',
         })
         
+        # Асинхронная загрузка для event loop Brain; синхронные вызовы заводят свою на время вызова
+        self.fetcher = self.new_fetcher()
+        # Разбор в отдельных процессах (0 — в пуле потоков текущего процесса)
+        self.parse_pool = ParsePool(parse_processes) if parse_processes > 0 else None
+        # Загруженные страницы и извлечённый текст на диске: повторный поиск не ходит в сеть и не разбирает
+        self.cache = HttpCache(cache_dir, cache_mb * 2 ** 20) if cache_dir and cache_mb > 0 else None
+
         # Настройка логирования
         logging.basicConfig(level=logging.INFO)
         self.logger = logging.getLogger(__name__)
 
-    def extract_content(self, soup):
-        """Извлекает основной контент страницы"""
-        content_selectors = [
-            'article',
-            '[role="main"]',
-            '.content',
-            '.main-content',
-            '.post-content',
-            '.entry-content',
-            '#content',
-            '.article-body'
-        ]
-        
-        # Пробуем найти основной контент
-        for selector in content_selectors:
-            content = soup.select_one(selector)
-            if content:
-                return content
-        
-        # Если не нашли, берём body
-        return soup.find('body') or soup
-
-    def clean_text(self, soup):
-        """Очищает текст от ненужных элементов"""
-        # Удаляем скрипты, стили, навигацию
-        for element in soup(['script', 'style', 'nav', 'header', 'footer', 
-                           'aside', 'advertisement', '.ad', '.ads']):
-            element.decompose()
-        
-        # Извлекаем текст из параграфов, заголовков и списков
-        text_elements = soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'div'])
-        
-        texts = []
-        for element in text_elements:
-            text = element.get_text(strip=True)
-            if len(text) > 20:  # Игнорируем слишком короткие тексты
-                texts.append(text)
-        
-        return ' '.join(texts)
+    def new_fetcher(self):
+        return PageFetcher(
+            headers=dict(self.session.headers), timeout=self.timeout,
+            max_concurrency=self.max_concurrency, per_host=self.per_host, interval=self.delay
+        )
 
-    def extract_metadata(self, soup):
-        """Извлекает метаданные страницы"""
-        metadata = {}
-        
-        # Заголовок
-        title = soup.find('title')
-        metadata['title'] = title.get_text(strip=True) if title else 'Без заголовка'
-        
-        # Описание
-        description = soup.find('meta', attrs={'name': 'description'})
-        metadata['description'] = description.get('content', '') if description else ''
-        
-        # Ключевые слова
-        keywords = soup.find('meta', attrs={'name': 'keywords'})
-        metadata['keywords'] = keywords.get('content', '') if keywords else ''
-        
-        # Open Graph данные
-        og_title = soup.find('meta', property='og:title')
-        if og_title:
-            metadata['og_title'] = og_title.get('content', '')
-            
-        og_description = soup.find('meta', property='og:description')
-        if og_description:
-            metadata['og_description'] = og_description.get('content', '')
-        
-        return metadata
+    async def warm_up(self):
+        if self.parse_pool is not None:
+            await self.parse_pool.warm_up()
+
+    async def aclose(self):
+        await self.fetcher.aclose()
+        if self.parse_pool is not None:
+            self.parse_pool.shutdown()
+        if self.cache is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.cache.flush)
 
     def parse_page(self, url, extract_links=False):
         """Парсит одну страницу"""
@@ -117,64 +144,142 @@ class WebPageParser:
             if not parsed.scheme or not parsed.netloc:
                 raise ValueError("Невалидный URL")
             
-            response = self.session.get(url, timeout=self.timeout)
-            response.raise_for_status()
+            with tracer.span("web.fetch", host=parsed.netloc):
+                response = self.session.get(url, timeout=self.timeout)
+                response.raise_for_status()
             
-            # Определяем кодировку
-            response.encoding = response.apparent_encoding
+            # Кодировку из заголовка берём, только если она указана явно; иначе её определит разбор
+            declared = response.encoding if 'charset' in response.headers.get('content-type', '').lower() else None
+            return self.parse_html(url, response.status_code, response.content, extract_links, declared)
             
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Извлекаем основной контент
-            main_content = self.extract_content(soup)
-            
-            result = {
-                'url': url,
-                'status_code': response.status_code,
-                'metadata': self.extract_metadata(soup),
-                'content': self.clean_text(main_content),
-                'content_length': len(self.clean_text(main_content)),
-                'links': []
-            }
+        except requests.exceptions.Timeout:
+            self.logger.error(f"Timeout для {url}")
+            return {'url': url, 'error': 'Timeout'}
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Ошибка запроса для {url}: {e}")
+            return {'url': url, 'error': str(e)}
+        except Exception as e:
+            self.logger.error(f"Неожиданная ошибка для {url}: {e}")
+            return {'url': url, 'error': str(e)}
+
+    def parse_html(self, url, status_code, markup, extract_links=False, encoding=None):
+        """Разбирает загруженную страницу (str или bytes) за один проход, без построения дерева"""
+        with tracer.span("web.parse", bytes=len(markup)):
+            extracted = extract(markup, extract_links, url, encoding)
+        return self._page_record(url, status_code, extracted)
+
+    def _page_record(self, url, status_code, extracted):
+        return {
+            'url': url,
+            'status_code': status_code,
+            'metadata': extracted['metadata'],
+            'content': extracted['content'],
+            'content_length': len(extracted['content']),
+            'links': extracted['links']
+        }
+
+    async def parse_page_async(self, url, extract_links=False, fetcher=None):
+        """
+        Загружает страницу без блокировки event loop; разбор идёт в пуле процессов (или потоков).
+        Свежая страница из кэша возвращается без сети и разбора, устаревшая — перепроверяется условным GET.
+        """
+        fetcher = fetcher or self.fetcher
+        loop = asyncio.get_running_loop()
+        try:
+            self.logger.info(f"Парсинг: {url}")
+            parsed = urlparse(url)
+            if not parsed.scheme or not parsed.netloc:
+                raise ValueError("Невалидный URL")
             
-            # Извлекаем ссылки если нужно
-            if extract_links:
-                links = soup.find_all('a', href=True)
-                for link in links:
-                    href = link['href']
-                    absolute_url = urljoin(url, href)
-                    link_text = link.get_text(strip=True)
-                    if link_text:
-                        result['links'].append({
-                            'url': absolute_url,
-                            'text': link_text
-                        })
+            # Индекс кэша в памяти; файлы кэша читаются и пишутся в пуле потоков, не в event loop
+            entry = self.cache.lookup(url) if self.cache is not None else None
+            if entry is not None and entry['fresh']:
+                with tracer.span("web.cache", host=parsed.netloc):
+                    record = await self._cached_record(url, entry, extract_links)
+                if record is not None:
+                    return record
+                entry = None  # файлы записи пропали — загружаем заново
             
-            return result
+            response = await fetcher.fetch(url, self.cache.validators(entry) if entry is not None else None)
+            if response.status_code == 304 and entry is not None:
+                await loop.run_in_executor(None, self.cache.revalidated, entry, response)
+                record = await self._cached_record(url, entry, extract_links)
+                if record is not None:
+                    return record
+                response = await fetcher.fetch(url)
             
-        except requests.exceptions.Timeout:
+            stored = None
+            if self.cache is not None:
+                stored = await loop.run_in_executor(None, self.cache.store, url, response, response.content)
+            extracted = await self._extract(url, response.content, response.charset_encoding, extract_links)
+            if stored is not None:
+                await loop.run_in_executor(None, self.cache.store_extracted, stored, extracted, extract_links)
+            return self._page_record(url, response.status_code, extracted)
+        except httpx.TimeoutException:
             self.logger.error(f"Timeout для {url}")
             return {'url': url, 'error': 'Timeout'}
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             self.logger.error(f"Ошибка запроса для {url}: {e}")
             return {'url': url, 'error': str(e)}
         except Exception as e:
             self.logger.error(f"Неожиданная ошибка для {url}: {e}")
             return {'url': url, 'error': str(e)}
 
+    async def _extract(self, url, markup, encoding, extract_links):
+        if self.parse_pool is None:
+            with tracer.span("web.parse", bytes=len(markup)):
+                return await asyncio.get_running_loop().run_in_executor(
+                    None, extract, markup, extract_links, url, encoding
+                )
+        # В процесс уходят байты страницы, обратно — только извлечённый текст
+        with tracer.span("web.parse", bytes=len(markup), process=True):
+            return await self.parse_pool.extract(markup, encoding, extract_links, url)
+
+    async def _cached_record(self, url, entry, extract_links):
+        """Страница из кэша: сохранённый текст, а если его нет (нужны ссылки) — разбор сохранённого тела"""
+        loop = asyncio.get_running_loop()
+        extracted = await loop.run_in_executor(None, self.cache.load_extracted, entry, extract_links)
+        if extracted is None:
+            markup = await loop.run_in_executor(None, self.cache.load_body, entry)
+            if markup is None:
+                return None
+            extracted = await self._extract(url, markup, entry['encoding'], extract_links)
+            await loop.run_in_executor(None, self.cache.store_extracted, entry, extracted, extract_links)
+        return self._page_record(url, entry['status'], extracted)
+
+    async def iter_pages(self, urls, extract_links=False, fetcher=None):
+        """Загружает страницы параллельно и выдаёт результаты по мере готовности — самые быстрые первыми"""
+        tasks = [asyncio.ensure_future(self.parse_page_async(url, extract_links, fetcher)) for url in urls]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # Потребитель взял сколько нужно — остальные загрузки не нужны
+            for task in tasks:
+                task.cancel()
+
     def parse_multiple_pages(self, urls, extract_links=False):
-        """Парсит несколько страниц с задержкой"""
-        results = []
+        """Парсит несколько страниц параллельно; результаты в порядке urls"""
+        async def parse_all(fetcher):
+            results = {}
+            async for result in self.iter_pages(urls, extract_links, fetcher):
+                results[result['url']] = result
+            return [results[url] for url in urls]
         
-        for i, url in enumerate(urls):
-            result = self.parse_page(url, extract_links)
-            results.append(result)
-            
-            # Добавляем задержку между запросами
-            if i < len(urls) - 1:
-                time.sleep(self.delay)
+        return self._run_sync(parse_all)
+
+    def _run_sync(self, work):
+        """Выполняет work(fetcher) в отдельном event loop (для вызовов вне Brain)"""
+        async def run():
+            fetcher = self.new_fetcher()
+            try:
+                return await work(fetcher)
+            finally:
+                await fetcher.aclose()
+                if self.cache is not None:
+                    await asyncio.get_running_loop().run_in_executor(None, self.cache.flush)
         
-        return results
+        return asyncio.run(run())
 
     def web_search(self, query, num_results=5):
         """
@@ -185,61 +290,61 @@ class WebPageParser:
             num_results (int): Количество сайтов для парсинга (по умолчанию 5)
             
         Returns:
-            list: Список строк с контентом найденных сайтов
+            list: Список строк с контентом найденных сайтов (первыми — быстрее загрузившиеся)
         """
+        return self._run_sync(lambda fetcher: self.web_search_async(query, num_results, fetcher))
+
+    async def search_urls(self, query, num_results=5, fetcher=None):
+        """Ссылки из выдачи Google Custom Search (ошибки запроса не перехватываются)"""
         if not self.api_key or not self.cx:
             raise ValueError("API ключ и CX должны быть установлены для поиска")
+        fetcher = fetcher or self.fetcher
+
+        params = {
+            'q': query,
+            'key': self.api_key,
+            'cx': self.cx,
+            'num': num_results
+        }
         
-        try:
-            # Выполняем поиск через Google Custom Search API
-            search_url = f"https://www.googleapis.com/customsearch/v1"
-            params = {
-                'q': query,
-                'key': self.api_key,
-                'cx': self.cx,
-                'num': num_results
-            }
-            
-            self.logger.info(f"Выполняем поиск: {query}")
-            search_response = requests.get(search_url, params=params, timeout=self.timeout)
+        self.logger.info(f"Выполняем поиск: {query}")
+        with tracer.span("web.search_api"):
+            search_response = await fetcher.pool.get(self.search_url, params=params)
             search_response.raise_for_status()
+        
+        # Получаем ссылки из результатов поиска
+        urls = [item["link"] for item in search_response.json().get("items", [])[:num_results]]
+        if not urls:
+            self.logger.warning("Не найдено ссылок в результатах поиска")
+        return urls
+
+    async def web_search_async(self, query, num_results=5, fetcher=None):
+        """То же, что web_search, в текущем event loop: страницы загружаются параллельно"""
+        if not self.api_key or not self.cx:
+            raise ValueError("API ключ и CX должны быть установлены для поиска")
+        fetcher = fetcher or self.fetcher
+        
+        try:
+            urls = await self.search_urls(query, num_results, fetcher)
             
-            search_results = search_response.json()
-            
-            # Получаем ссылки из результатов поиска
-            urls = []
-            items = search_results.get("items", [])
-            for item in items[:num_results]:
-                urls.append(item["link"])
-            
-            if not urls:
-                self.logger.warning("Не найдено ссылок в результатах поиска")
-                return []
-            
-            # Парсим найденные страницы
-            parsed_results = self.parse_multiple_pages(urls, extract_links=False)
-            
-            # Формируем список строк с контентом
-            content_list = []
-            for result in parsed_results:
-                if 'error' not in result and result.get('content'):
-                    # Формируем строку с информацией о сайте
-                    title = result['metadata'].get('title', 'Без заголовка')
-                    url = result['url']
-                    content = result['content']
-                    
-                    formatted_content = f"Заголовок: {title}\nURL: {url}\nКонтент: {content}\n{'-'*80}"
-                    content_list.append(formatted_content)
-                else:
-                    # Добавляем информацию об ошибке
-                    error_msg = f"Ошибка при парсинге {result['url']}: {result.get('error', 'Неизвестная ошибка')}"
-                    content_list.append(error_msg)
-            
-            return content_list
+            # Парсим найденные страницы параллельно, в порядке готовности
+            return [self.format_result(result) async for result in self.iter_pages(urls, False, fetcher)]
             
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             self.logger.error(f"Ошибка поиска: {e}")
             return [f"Ошибка поиска: {e}"]
         except Exception as e:
             self.logger.error(f"Неожиданная ошибка поиска: {e}")
             return [f"Неожиданная ошибка поиска: {e}"]
+
+    def format_result(self, result):
+        """Строка с контентом сайта (или описанием ошибки) для передачи модели"""
+        if 'error' not in result and result.get('content'):
+            # Формируем строку с информацией о сайте
+            title = result['metadata'].get('title', 'Без заголовка')
+            url = result['url']
+            content = result['content']
+            
+            return f"Заголовок: {title}\nURL: {url}\nКонтент: {content}\n{'-'*80}"
+        # Добавляем информацию об ошибке
+        return f"Ошибка при парсинге {result['url']}: {result.get('error', 'Неизвестная ошибка')}"
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Сравнение разбора страниц: дерево BeautifulSoup (прежний WebPageParser.parse_page) и однопроходный
+app/services/html_extract.py на каждом установленном парсере (lxml, selectolax, html.parser).
+
+Корпус — каталог сохранённых страниц (*.html, *.htm). Пополнить его реальными страницами:
+
+  python bench/html_bench.py --corpus pages --fetch https://ru.wikipedia.org/wiki/Python https://habr.com/ru/news/
+
+Без корпуса используются синтетические страницы с глубокой вложенностью, как у новостных сайтов:
+
+  python bench/html_bench.py --repeat 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bs4 import BeautifulSoup
+
+from app.services.html_extract import available_backends, extract
+from app.services.web import WebPageParser
+
+
+WORDS = (
+    "Разумеется сэр это вполне решаемо хотя и не слишком элегантно Позвольте напомнить что "
+    "предыдущая попытка закончилась пожаром в мастерской Тем не менее данные говорят сами за себя"
+).split()
+
+
+def synthetic_page(rng: random.Random, paragraphs: int, depth: int) -> str:
+    """Страница «как в жизни»: обёртки div в несколько слоёв, меню, скрипты, статья, комментарии, таблица"""
+    def sentence(words=30):
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+    menu = "".join(f"<li><a href=\"/section/{i}\">Раздел {i}</a></li>" for i in range(150))
+    article = "".join(
+        f"<div class=\"block\"><div class=\"inner\"><p>{sentence()} <b>{sentence(5)}</b> {sentence()}</p></div></div>"
+        if i % 3 else f"<h2>{sentence(6)}</h2><p>{sentence(50)}</p>"
+        for i in range(paragraphs)
+    )
+    comments = ""
+    for i in range(paragraphs // 4):
+        comments = f"<div class=\"comment\"><div class=\"text\">{sentence(20)}</div>{comments}</div>" if i % 8 else comments
+    table = "".join(f"<tr><td>{sentence(4)}</td><td>{sentence(8)}</td></tr>" for _ in range(60))
+    opening = "".join(f"<div class=\"layer-{i}\">" for i in range(depth))
+    closing = "</div>" * depth
+    return (
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Синтетическая страница</title>"
+        "<meta name=\"description\" content=\"Страница для замера разбора\">"
+        "<meta property=\"og:title\" content=\"Синтетика\">"
+        + "".join(f"<script>window.data{i} = {{\"x\": \"{sentence(40)}\"}};</script>" for i in range(20))
+        + "<style>.a{color:red}</style></head><body>"
+        f"<header><nav><ul>{menu}</ul></nav></header>{opening}"
+        f"<div class=\"content\"><article><h1>{sentence(8)}</h1>{article}</article>"
+        f"<section class=\"comments\">{comments}</section><table>{table}</table></div>"
+        f"{closing}<footer><p>{sentence(20)}</p></footer></body></html>"
+    )
+
+
+def load_corpus(directory: str) -> list:
+    pages = []
+    for folder, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith((".html", ".htm")):
+                with open(os.path.join(folder, name), "rb") as f:
+                    pages.append((name, f.read()))
+    return pages
+
+
+def fetch_into(directory: str, urls: list):
+    """Сохраняет страницы в корпус (файл называется по адресу)"""
+    parser = WebPageParser()
+    os.makedirs(directory, exist_ok=True)
+    for url in urls:
+        response = parser.session.get(url, timeout=parser.timeout)
+        response.raise_for_status()
+        name = "".join(c if c.isalnum() else "_" for c in url.split("://", 1)[-1])[:120] + ".html"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(response.content)
+        print(f"сохранено: {name} ({len(response.content) // 1024} КБ)", file=sys.stderr)
+
+
+# Прежний разбор по дереву BeautifulSoup (методы WebPageParser до однопроходного извлечения)
+
+
+def extract_content(soup):
+    """Извлекает основной контент страницы"""
+    content_selectors = [
+        'article',
+        '[role="main"]',
+        '.content',
+        '.main-content',
+        '.post-content',
+        '.entry-content',
+        '#content',
+        '.article-body'
+    ]
+
+    # Пробуем найти основной контент
+    for selector in content_selectors:
+        content = soup.select_one(selector)
+        if content:
+            return content
+
+    # Если не нашли, берём body
+    return soup.find('body') or soup
+
+
+def clean_text(soup):
+    """Очищает текст от ненужных элементов"""
+    # Удаляем скрипты, стили, навигацию
+    for element in soup(['script', 'style', 'nav', 'header', 'footer',
+                       'aside', 'advertisement', '.ad', '.ads']):
+        element.decompose()
+
+    # Извлекаем текст из параграфов, заголовков и списков
+    text_elements = soup.find_all(['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'div'])
+
+    texts = []
+    for element in text_elements:
+        text = element.get_text(strip=True)
+        if len(text) > 20:  # Игнорируем слишком короткие тексты
+            texts.append(text)
+
+    return ' '.join(texts)
+
+
+def extract_metadata(soup):
+    """Извлекает метаданные страницы"""
+    metadata = {}
+
+    # Заголовок
+    title = soup.find('title')
+    metadata['title'] = title.get_text(strip=True) if title else 'Без заголовка'
+
+    # Описание
+    description = soup.find('meta', attrs={'name': 'description'})
+    metadata['description'] = description.get('content', '') if description else ''
+
+    # Ключевые слова
+    keywords = soup.find('meta', attrs={'name': 'keywords'})
+    metadata['keywords'] = keywords.get('content', '') if keywords else ''
+
+    # Open Graph данные
+    og_title = soup.find('meta', property='og:title')
+    if og_title:
+        metadata['og_title'] = og_title.get('content', '')
+
+    og_description = soup.find('meta', property='og:description')
+    if og_description:
+        metadata['og_description'] = og_description.get('content', '')
+
+    return metadata
+
+
+def legacy_parse(markup: bytes) -> dict:
+    """Прежний разбор из parse_page: дерево, поиск контента, clean_text (дважды, как было)"""
+    soup = BeautifulSoup(markup, "html.parser")
+    main_content = extract_content(soup)
+    return {
+        "metadata": extract_metadata(soup),
+        "content": clean_text(main_content),
+        "content_length": len(clean_text(main_content)),
+    }
+
+
+def best_time(function, repeat: int) -> tuple:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер разбора HTML: BeautifulSoup против однопроходного")
+    parser.add_argument("--corpus", default=None, help="каталог с сохранёнными страницами")
+    parser.add_argument("--fetch", nargs="*", default=[], help="скачать страницы в --corpus перед замером")
+    parser.add_argument("--repeat", type=int, default=3, help="лучшее из N запусков на страницу")
+    parser.add_argument("--synthetic", type=int, default=6, help="сколько синтетических страниц без корпуса")
+    args = parser.parse_args()
+
+    if args.fetch:
+        if not args.corpus:
+            parser.error("--fetch требует --corpus")
+        fetch_into(args.corpus, args.fetch)
+    if args.corpus:
+        pages = load_corpus(args.corpus)
+    else:
+        rng = random.Random(1)
+        pages = [
+            (f"synthetic-{i}", synthetic_page(rng, 150 * (i + 1), 10 + 5 * i).encode("utf-8"))
+            for i in range(args.synthetic)
+        ]
+    if not pages:
+        parser.error("в корпусе нет страниц")
+
+    backends = available_backends()
+    totals = {"soup": 0.0, **{backend: 0.0 for backend in backends}}
+    total_bytes = 0
+    print(f"{'страница':<32}{'КБ':>7}{'soup, мс':>11}" + "".join(f"{backend + ', мс':>16}" for backend in backends)
+          + f"{'текст soup':>12}{'текст 1 пр.':>13}")
+    for name, markup in pages:
+        legacy_time, legacy = best_time(lambda: legacy_parse(markup), args.repeat)
+        total_bytes += len(markup)
+        totals["soup"] += legacy_time
+        row = f"{name[:31]:<32}{len(markup) // 1024:>7}{legacy_time * 1000:>11.1f}"
+        for backend in backends:
+            elapsed, single = best_time(lambda: extract(markup, backend=backend), args.repeat)
+            totals[backend] += elapsed
+            row += f"{elapsed * 1000:>16.1f}"
+        print(row + f"{len(legacy['content']):>12}{len(single['content']):>13}")
+
+    megabytes = total_bytes / 2 ** 20
+    print(f"\nвсего {megabytes:.1f} МБ, пропускная способность:")
+    for name, elapsed in totals.items():
+        print(f"  {name:<12}{megabytes / elapsed:>8.1f} МБ/с  ({totals['soup'] / elapsed:.1f}x к soup)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Регрессионная проверка парсеров HTML: все установленные источники событий (lxml, selectolax, html.parser)
+должны давать одинаковый результат extract() — метаданные, контент и ссылки.
+
+  python bench/html_regress.py                 # встроенные трудные случаи и синтетические страницы
+  python bench/html_regress.py --corpus pages  # плюс сохранённые страницы (см. html_bench.py --fetch)
+
+Код выхода 1, если хоть один парсер разошёлся с эталонным (--reference, по умолчанию html.parser).
+"""
+
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.services.html_extract import available_backends, extract
+from bench.html_bench import load_corpus, synthetic_page
+
+
+# Разметка, на которой парсеры расходятся чаще всего
+CASES = {
+    "implied-body": "<p>First paragraph long enough here<p>Second paragraph long enough here<div>div text long enough</div>",
+    "table": "<table><tr><td>cell one text is long enough<td>cell two text is long enough</table>",
+    "list": "<ul><li>item one long enough text<li>item two long enough <b>bold</b></ul>tail text that is long enough",
+    "div-in-p": "<p>para <div>div inside p long enough text</div> after div long enough text</p>",
+    "heading-in-p": "<p>intro text is long enough here<h2>heading text is long enough</h2>tail text is long enough</p>",
+    "inline-space": "<div>word <a href=/x>link text</a> <span>span</span>\n more words to make it long</div>",
+    "entities": "<p>&nbsp;Non&nbsp;breaking &laquo;quotes&raquo; &amp; more text to pass</p>",
+    "stray-end": "<div>first block long enough text</div></div></span><div>second block long enough text</div>",
+    "unclosed-b": "<p><b>bold starts in paragraph long<p>continues into next paragraph long</b> end</p>",
+    "upper-case": "<DIV CLASS='content'><P>Upper case markup text long enough</P></DIV><div>outside text long</div>",
+    "comment": "<div>before comment text long<!-- <p>hidden</p> --> after comment text</div>",
+    "script-div": "<div>visible text long enough here<script>document.write('</div>')</script> more visible</div>",
+    "textarea": "<div><textarea>text area content <b>not bold</b> long</textarea>text after the textarea</div>",
+    "article-header": "<article><header><h1>Heading inside header</h1></header><p>Body of article long enough</p></article>",
+    "svg-title": "<head></head><body><svg><title>svg title</title></svg><p>paragraph text long enough here</p></body>",
+    "nested-a": "<p><a href='/1'>first link <a href='/2'>second link</a> text</a> paragraph text long enough</p>",
+    "pre": "<pre>  code   block\n  with   spaces and long enough</pre>",
+    "meta": "<head><title> Title\n text </title><meta name='Description' content='d'><meta property='og:title' "
+            "content='og'></head><body><div role='main'>main region text long enough</div></body>",
+}
+
+
+def first_difference(left: str, right: str) -> str:
+    index = next((i for i, (a, b) in enumerate(zip(left, right)) if a != b), min(len(left), len(right)))
+    return f"позиция {index}: {left[max(index - 30, 0):index + 30]!r} / {right[max(index - 30, 0):index + 30]!r}"
+
+
+def compare(name: str, markup, backends: list, reference: str) -> list:
+    """Расхождения с эталонным парсером: список строк с описанием"""
+    expected = extract(markup, True, "http://example.org/", backend=reference)
+    problems = []
+    for backend in backends:
+        actual = extract(markup, True, "http://example.org/", backend=backend)
+        for key in ("metadata", "links", "content"):
+            if actual[key] != expected[key]:
+                if key == "content":
+                    detail = first_difference(expected[key], actual[key])
+                else:
+                    detail = f"{expected[key]!r} / {actual[key]!r}"
+                problems.append(f"{name}: {backend} расходится с {reference} в {key} — {detail}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Одинаковый ли результат у всех парсеров HTML")
+    parser.add_argument("--corpus", default=None, help="каталог с сохранёнными страницами")
+    parser.add_argument("--reference", default="html.parser", help="эталонный парсер")
+    parser.add_argument("--synthetic", type=int, default=4, help="сколько синтетических страниц добавить")
+    args = parser.parse_args()
+
+    backends = [name for name in available_backends() if name != args.reference]
+    if not backends:
+        print(f"Кроме {args.reference} парсеров не установлено — сравнивать не с чем")
+        return
+    rng = random.Random(7)
+    pages = list(CASES.items())
+    pages += [(f"synthetic-{i}", synthetic_page(rng, 60 * (i + 1), 8 + 4 * i)) for i in range(args.synthetic)]
+    if args.corpus:
+        pages += load_corpus(args.corpus)
+
+    problems = []
+    for name, markup in pages:
+        problems += compare(name, markup, backends, args.reference)
+    for problem in problems:
+        print(problem)
+    print(f"страниц: {len(pages)}, парсеры: {', '.join(backends)} против {args.reference}, "
+          f"расхождений: {len(problems)}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
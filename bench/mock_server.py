@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Mistral API и Google Custom Search для замеров без внешней сети.
+
+Отвечает на:
+  POST /v1/chat/completions   — потоковые (SSE) и обычные ответы, в том числе с tool_calls
+  GET  /v1/models             — пинг keep-alive
+  GET  /customsearch/v1       — выдача в формате Google Custom Search JSON API
+  GET  /page/<n>              — синтетические HTML-страницы для парсера (с ETag и Cache-Control: max-age)
+
+Запуск отдельно: python bench/mock_server.py --port 8808 --latency 0.2 --failure-rate 0.05
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from urllib.parse import parse_qs, quote, urlsplit
+
+
+WORDS = (
+    "Разумеется сэр это вполне решаемо хотя и не слишком элегантно Позвольте напомнить что "
+    "предыдущая попытка закончилась пожаром в мастерской Тем не менее данные говорят сами за себя"
+).split()
+# Слова, по которым «модель» решает вызвать функцию; без них отвечает текстом, даже если функции переданы
+TOOL_TRIGGERS = {
+    "web_search": ("найд", "поищ", "загугл", "новост", "погод"),
+    "open_app": ("открой", "запуст"),
+    "set_volume": ("громкост", "звук"),
+    "empty_recycle_bin": ("корзин",),
+}
+
+
+class MockConfig:
+    """Задержки в секундах и доли запросов с искусственными сбоями"""
+
+    def __init__(self, latency: float = 0.15, token_delay: float = 0.01, tokens: int = 30,
+                 search_latency: float = 0.1, page_latency: float = 0.05, page_kb: int = 40, page_hosts: int = 3,
+                 page_max_age: int = 60,
+                 failure_rate: float = 0.0, slow_rate: float = 0.0, slow_factor: float = 5.0,
+                 jitter: float = 0.2, seed: int = None):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.search_latency = search_latency
+        self.page_latency = page_latency
+        self.page_kb = page_kb
+        self.page_hosts = page_hosts  # по скольким адресам 127.0.0.N раскладывать выдачу (разные «сайты»)
+        self.page_max_age = page_max_age  # Cache-Control: max-age страниц, с (0 — no-cache, только перепроверка)
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.jitter = jitter
+        self.seed = seed
+
+
+class MockServer:
+    """HTTP/1.1-сервер на asyncio с keep-alive и chunked-ответами для SSE"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, config: MockConfig = None):
+        self.host = host
+        self.port = port
+        self.config = config or MockConfig()
+        self.random = random.Random(self.config.seed)
+        self.server = None
+        self.page_hosts = [self.host]
+        self._extra_servers = []
+        self.stats = {"requests": 0, "connections": 0, "failures_injected": 0, "slow_injected": 0,
+                      "not_modified": 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.host == "127.0.0.1":
+            # Ссылки выдачи ведут на разные адреса loopback — как на разные сайты (на macOS доступен только 127.0.0.1)
+            for n in range(2, self.config.page_hosts + 1):
+                try:
+                    extra = await asyncio.start_server(self._serve_connection, f"127.0.0.{n}", self.port)
+                except OSError:
+                    break
+                self._extra_servers.append(extra)
+                self.page_hosts.append(f"127.0.0.{n}")
+        return self.base_url
+
+    async def close(self):
+        for server in [self.server, *self._extra_servers]:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    # --- HTTP ---
+
+    async def _serve_connection(self, reader, writer):
+        self.stats["connections"] += 1
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                self.stats["requests"] += 1
+                await self._route(method, target, headers, body, writer)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, target: str, headers: dict, body: bytes, writer):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        if url.path == "/v1/chat/completions" and method == "POST":
+            await self._chat(json.loads(body or b"{}"), writer)
+        elif url.path == "/v1/models":
+            await self._send_json(writer, 200, {"object": "list", "data": [{"id": "mock"}]})
+        elif url.path == "/customsearch/v1":
+            await self._search(query, writer)
+        elif url.path.startswith("/page/"):
+            await self._page(url.path.rsplit("/", 1)[-1], query, headers, writer)
+        else:
+            await self._send_json(writer, 404, {"error": "not found"})
+
+    async def _send(self, writer, status: int, body: bytes, content_type: str, extra: dict = None):
+        reason = {200: "OK", 304: "Not Modified", 404: "Not Found", 503: "Service Unavailable"}.get(status, "OK")
+        headers = [f"HTTP/1.1 {status} {reason}", f"Content-Type: {content_type}",
+                   f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        headers += [f"{name}: {value}" for name, value in (extra or {}).items()]
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, payload, extra: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        await self._send(writer, status, body, "application/json", extra)
+
+    # --- Задержки и сбои ---
+
+    def _delay(self, base: float) -> float:
+        delay = base * (1 + self.random.uniform(-self.config.jitter, self.config.jitter))
+        if self.config.slow_rate and self.random.random() < self.config.slow_rate:
+            self.stats["slow_injected"] += 1
+            delay *= self.config.slow_factor
+        return max(delay, 0.0)
+
+    async def _maybe_fail(self, writer) -> bool:
+        if self.config.failure_rate and self.random.random() < self.config.failure_rate:
+            self.stats["failures_injected"] += 1
+            await asyncio.sleep(self._delay(self.config.latency) / 2)
+            await self._send_json(writer, 503, {"message": "injected failure"}, {"Retry-After": "0"})
+            return True
+        return False
+
+    # --- Mistral ---
+
+    def _reply(self, request: dict) -> dict:
+        """
+        Сообщение ассистента: вызов переданной функции, если реплика пользователя её просит
+        (как решила бы модель), иначе текст
+        """
+        messages = request.get("messages") or [{}]
+        last = messages[-1]
+        text = (last.get("content") or "").lower()
+        tools = [tool["function"]["name"] for tool in request.get("tools") or []
+                 if any(stem in text for stem in TOOL_TRIGGERS.get(tool["function"]["name"], ()))]
+        if last.get("role") == "user" and tools:
+            name = tools[0]
+            arguments = {
+                "web_search": {"query": last.get("content", "")},
+                "open_app": {"app_name": "calc"},
+                "set_volume": {"level": 50},
+            }.get(name, {})
+            return {"role": "assistant", "content": "", "tool_calls": [{
+                "id": f"call_{self.random.randrange(10 ** 8)}",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(arguments, ensure_ascii=False)}
+            }]}
+        words = [self.random.choice(WORDS) for _ in range(self.config.tokens)]
+        return {"role": "assistant", "content": " ".join(words).capitalize() + "."}
+
+    async def _chat(self, request: dict, writer):
+        if await self._maybe_fail(writer):
+            return
+        message = self._reply(request)
+        model = request.get("model", "mock")
+        await asyncio.sleep(self._delay(self.config.latency))
+
+        if not request.get("stream"):
+            await asyncio.sleep(self.config.token_delay * self.config.tokens)
+            await self._send_json(writer, 200, {
+                "id": "mock", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}]
+            })
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Transfer-Encoding: chunked\r\nConnection: keep-alive\r\n\r\n")
+        if message.get("tool_calls"):
+            deltas = [{"role": "assistant", "content": "", "tool_calls": [
+                {**call, "index": index} for index, call in enumerate(message["tool_calls"])
+            ]}]
+        else:
+            tokens = message["content"].split(" ")
+            deltas = [{"content": token + (" " if i < len(tokens) - 1 else "")} for i, token in enumerate(tokens)]
+
+        for i, delta in enumerate(deltas):
+            if i:
+                await asyncio.sleep(self.config.token_delay)
+            chunk = {"id": "mock", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": delta}]}
+            await self._write_chunk(writer, f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+        await self._write_chunk(writer, "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _write_chunk(self, writer, text: str):
+        data = text.encode("utf-8")
+        writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+        await writer.drain()
+
+    # --- Google и страницы ---
+
+    async def _search(self, query: dict, writer):
+        if await self._maybe_fail(writer):
+            return
+        await asyncio.sleep(self._delay(self.config.search_latency))
+        q = query.get("q", [""])[0]
+        num = min(int(query.get("num", ["5"])[0]), 10)
+        items = [{
+            "title": f"{q} — результат {i + 1}",
+            "link": f"http://{self.page_hosts[i % len(self.page_hosts)]}:{self.port}/page/{i + 1}?q={quote(q)}",
+            "snippet": f"Фрагмент страницы {i + 1} по запросу {q}",
+        } for i in range(num)]
+        await self._send_json(writer, 200, {"kind": "customsearch#search", "items": items})
+
+    async def _page(self, number: str, query: dict, headers: dict, writer):
+        await asyncio.sleep(self._delay(self.config.page_latency))
+        q = query.get("q", ["тема"])[0]
+        # Страница зависит только от адреса, поэтому у неё постоянный ETag и её можно перепроверять
+        etag = '"' + hashlib.sha1(f"{number}/{q}/{self.config.page_kb}".encode("utf-8")).hexdigest()[:16] + '"'
+        cache_headers = {
+            "ETag": etag,
+            "Cache-Control": f"max-age={self.config.page_max_age}" if self.config.page_max_age else "no-cache",
+        }
+        if headers.get("if-none-match") == etag:
+            self.stats["not_modified"] += 1
+            await self._send(writer, 304, b"", "text/html; charset=utf-8", cache_headers)
+            return
+        rng = random.Random(etag)
+        paragraphs = []
+        size = 0
+        while size < self.config.page_kb * 1024:
+            text = " ".join(rng.choice(WORDS) for _ in range(40))
+            paragraphs.append(f"<p>{q}: {text}.</p>")
+            size += len(paragraphs[-1].encode("utf-8"))
+        html = (
+            f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{q} — страница {number}</title>"
+            f"<meta name=\"description\" content=\"Описание страницы {number}\">"
+            f"<script>var tracking = {{page: {json.dumps(number)}}};</script><style>p {{margin: 0}}</style></head>"
+            f"<body><header><nav><a href=\"/\">Главная</a></nav></header>"
+            f"<article><h1>{q}</h1>{''.join(paragraphs)}</article>"
+            f"<footer>© Mock</footer></body></html>"
+        )
+        await self._send(writer, 200, html.encode("utf-8"), "text/html; charset=utf-8", cache_headers)
+
+
+def config_arguments(parser: argparse.ArgumentParser):
+    """Параметры MockConfig в командной строке (общие для сервера и бенчмарка)"""
+    defaults = MockConfig()
+    parser.add_argument("--latency", type=float, default=defaults.latency, help="задержка до первого токена, с")
+    parser.add_argument("--token-delay", type=float, default=defaults.token_delay, help="пауза между токенами, с")
+    parser.add_argument("--tokens", type=int, default=defaults.tokens, help="длина ответа в словах")
+    parser.add_argument("--search-latency", type=float, default=defaults.search_latency)
+    parser.add_argument("--page-latency", type=float, default=defaults.page_latency)
+    parser.add_argument("--page-kb", type=int, default=defaults.page_kb, help="размер HTML-страницы, КБ")
+    parser.add_argument("--page-hosts", type=int, default=defaults.page_hosts, help="на сколько адресов раскладывать выдачу")
+    parser.add_argument("--page-max-age", type=int, default=defaults.page_max_age, help="свежесть страниц, с")
+    parser.add_argument("--failure-rate", type=float, default=defaults.failure_rate, help="доля ответов 503")
+    parser.add_argument("--slow-rate", type=float, default=defaults.slow_rate, help="доля медленных ответов")
+    parser.add_argument("--slow-factor", type=float, default=defaults.slow_factor)
+    parser.add_argument("--jitter", type=float, default=defaults.jitter)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        latency=args.latency, token_delay=args.token_delay, tokens=args.tokens,
+        search_latency=args.search_latency, page_latency=args.page_latency, page_kb=args.page_kb,
+        page_hosts=args.page_hosts, page_max_age=args.page_max_age,
+        failure_rate=args.failure_rate, slow_rate=args.slow_rate, slow_factor=args.slow_factor,
+        jitter=args.jitter, seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Mistral API и Google Custom Search")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8808)
+    config_arguments(parser)
+    args = parser.parse_args()
+
+    server = MockServer(args.host, args.port, config_from_args(args))
+    print(f"Mock API: {server.base_url}")
+    print(f"  MISTRAL_API_URL={server.base_url}")
+    print(f"  GOOGLE_SEARCH_URL={server.base_url}/customsearch/v1")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Регрессионная проверка circuit breaker: пробный запрос в half-open, завершившийся без исхода
+(отменён или упал не по вине API), не должен оставлять breaker закрытым для всех последующих запросов.
+
+  python bench/resilience_regress.py
+
+Код выхода 1, если хоть одна проверка не прошла.
+"""
+
+import asyncio
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.core.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, UpstreamError
+
+
+def opened_caller() -> ResilientCaller:
+    """Breaker разомкнут, пауза уже истекла — следующий запрос будет пробным"""
+    caller = ResilientCaller(deadline=5, retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0))
+    caller.breaker.record_failure()
+    return caller
+
+
+async def ok():
+    return "ok"
+
+
+async def hang():
+    await asyncio.Event().wait()
+
+
+async def broken():
+    raise ValueError("ошибка разбора, API ни при чём")
+
+
+async def unavailable():
+    raise UpstreamError(503)
+
+
+async def cancelled_probe() -> str:
+    caller = opened_caller()
+    probe = asyncio.ensure_future(caller.call(hang))
+    await asyncio.sleep(0)
+    # Пока проба идёт, остальные запросы отклоняются
+    try:
+        await caller.call(ok)
+        return "второй запрос прошёл во время пробы"
+    except CircuitOpenError:
+        pass
+    probe.cancel()
+    await asyncio.gather(probe, return_exceptions=True)
+    result = await caller.call(ok)
+    return None if result == "ok" and caller.breaker.state == "closed" else f"state={caller.breaker.state}"
+
+
+async def unexpected_error_probe() -> str:
+    caller = opened_caller()
+    try:
+        await caller.call(broken)
+    except ValueError:
+        pass
+    result = await caller.call(ok)
+    return None if result == "ok" and caller.breaker.state == "closed" else f"state={caller.breaker.state}"
+
+
+async def failed_probe() -> str:
+    caller = opened_caller()
+    caller.breaker.reset_timeout = 60
+    caller.breaker.opened_at -= 60
+    try:
+        await caller.call(unavailable)
+    except UpstreamError:
+        pass
+    # Неудачная проба снова размыкает breaker на всю паузу
+    try:
+        await caller.call(ok)
+        return "запрос прошёл сразу после неудачной пробы"
+    except CircuitOpenError:
+        return None if caller.breaker.state == "open" else f"state={caller.breaker.state}"
+
+
+CHECKS = {
+    "отменённая проба": cancelled_probe,
+    "проба с посторонней ошибкой": unexpected_error_probe,
+    "неудачная проба": failed_probe,
+}
+
+
+def main():
+    problems = []
+    for name, check in CHECKS.items():
+        problem = asyncio.run(check())
+        print(f"{name}: {'ok' if problem is None else problem}")
+        if problem is not None:
+            problems.append(name)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Сквозной замер задержек Brain и WebPageParser на локальной замене внешних API.
+
+Поднимает bench/mock_server.py в том же процессе (или использует уже запущенный, --server),
+прогоняет сценарии и печатает p50/p95/p99 по каждому этапу:
+
+  python bench/run_bench.py --iterations 50
+  python bench/run_bench.py --latency 0.3 --failure-rate 0.05 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.mock_server import MockServer, config_arguments, config_from_args
+
+
+def percentile(samples: list, p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p), len(ordered) - 1)]
+
+
+class StageTimer:
+    """Замеры по этапам: имя этапа -> список длительностей в секундах"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def report(self) -> dict:
+        return {
+            stage: {
+                "n": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                "max_ms": round(max(values) * 1000, 1),
+            }
+            for stage, values in self.samples.items()
+        }
+
+
+async def timed_answer(brain, tracer, text: str, timer: StageTimer, scenario: str):
+    """Время до первого токена и до конца ответа через Brain.stream_answer"""
+    tracer.begin_turn()
+    started = time.perf_counter()
+    first = None
+    async for _ in brain.stream_answer(text):
+        if first is None:
+            first = time.perf_counter() - started
+            timer.record(f"{scenario}.first_token", first)
+    timer.record(f"{scenario}.total", time.perf_counter() - started)
+
+
+async def run(args):
+    server = None
+    base_url = args.server
+    if base_url is None:
+        server = MockServer(config=config_from_args(args))
+        base_url = await server.start()
+
+    # Настройки читаются при импорте — окружение задаём до импорта приложения
+    os.environ.update({
+        "MISTRAL_API_URL": base_url,
+        "MISTRAL_API_KEY": "bench",
+        "GOOGLE_SEARCH_URL": f"{base_url}/customsearch/v1",
+        "GOOGLE_SEARCH_API_KEY": "bench",
+        "GOOGLE_SEARCH_CX": "bench",
+        "JARVIS_DATA_DIR": tempfile.mkdtemp(prefix="jarvis-bench-"),
+        "SPECULATIVE_SEARCH": "1" if args.speculative_search else "0",
+        "JARVIS_TRACE_FILE": "",
+    })
+    from app.core.brain import Brain
+    from app.core.tracing import tracer
+
+    brain = Brain()
+    # Повторы вопросов не должны попадать в кэш ответов — замеряется путь до API
+    brain.response_cache.put = lambda *_: None
+    await brain.warm_up()
+    loop = asyncio.get_running_loop()
+    timer = StageTimer()
+
+    try:
+        for i in range(args.iterations):
+            await timed_answer(brain, tracer, f"Расскажи что-нибудь интересное о звёздах, вариант {i}",
+                               timer, "chat")
+            if args.search:
+                await timed_answer(brain, tracer, f"Найди новости про космос {i}", timer, "search_answer")
+
+                started = time.perf_counter()
+                await loop.run_in_executor(None, brain.web_parser.web_search, f"погода {i}", args.pages)
+                timer.record("web_search", time.perf_counter() - started)
+
+                started = time.perf_counter()
+                await loop.run_in_executor(None, brain.web_parser.parse_page, f"{base_url}/page/{i % 5 + 1}")
+                timer.record("web_page", time.perf_counter() - started)
+
+            await brain.compact_history()
+            print(f"\rИтерация {i + 1}/{args.iterations}", end="", file=sys.stderr, flush=True)
+        print(file=sys.stderr)
+    finally:
+        await brain.close()
+        if server is not None:
+            await server.close()
+
+    tracer.export(args.trace)
+    return {
+        "stages": timer.report(),
+        "trace": tracer.stats(),
+        "pool": brain.pool_stats(),
+        "resilience": brain.resilience.stats,
+        "models": brain.model_router.stats(),
+        "page_cache": brain.web_parser.cache.summary() if brain.web_parser.cache is not None else None,
+        "server": server.stats if server is not None else None,
+    }
+
+
+def print_report(result: dict):
+    print(f"{'этап':<26}{'n':>6}{'p50, мс':>11}{'p95, мс':>11}{'p99, мс':>11}{'max, мс':>11}")
+    for stage, row in result["stages"].items():
+        print(f"{stage:<26}{row['n']:>6}{row['p50_ms']:>11}{row['p95_ms']:>11}{row['p99_ms']:>11}{row['max_ms']:>11}")
+    print("\nэтапы изнутри (трассировка):")
+    for stage, row in result["trace"].items():
+        print(f"{stage:<26}{row['n']:>6}{row['p50_ms']:>11}{row['p95_ms']:>11}{row['p99_ms']:>11}")
+    for name in ("pool", "resilience", "models", "server"):
+        if result[name] is not None:
+            print(f"{name}: {result[name]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер задержек JARVIS на локальной замене Mistral и Google")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--server", default=None, help="адрес уже запущенного mock_server.py")
+    parser.add_argument("--no-search", dest="search", action="store_false", help="только болтовня, без веб-поиска")
+    parser.add_argument("--pages", type=int, default=3, help="сколько страниц читать в web_search")
+    parser.add_argument("--speculative-search", action="store_true", help="упреждающий поиск (по умолчанию выключен)")
+    parser.add_argument("--json", default=None, help="сохранить результаты в файл")
+    parser.add_argument("--trace", default=os.path.join(tempfile.gettempdir(), "jarvis_bench_trace.json"),
+                        help="файл трассировки (chrome://tracing)")
+    config_arguments(parser)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,83 @@
+import argparse
 import asyncio
-import httpx
+import queue
+import threading
 import speech_recognition as sr
 
 from app.core.brain import Brain
-from app.services.speak import SpeakService
+from app.core.profiler import profiler
+from app.core.tracing import tracer
+from app.services.listen import StreamingRecognizer
+from app.services.speak import SentenceBuffer, SpeakService
 
 
+async def stream_to_queue(brain, text, sentences):
+    """Складывает законченные предложения ответа в очередь озвучки по мере генерации"""
+    buffer = SentenceBuffer()
+    try:
+        async for token in brain.stream_answer(user_input=text):
+            print(token, end="", flush=True)
+            for sentence in buffer.feed(token):
+                sentences.put(sentence)
+        rest = buffer.flush()
+        if rest:
+            sentences.put(rest)
+        print()
+    finally:
+        sentences.put(None)
 
 
+def main(profile=False):
+    if profile:
+        # Профиль сохраняется при выходе (Ctrl+C)
+        profiler.start()
 
+    recognizer = StreamingRecognizer()
+    speak_service = SpeakService()
+    brain = Brain()
 
-recognizer = sr.Recognizer()
-speak_service = SpeakService()
-brain = Brain()
+    # Один постоянный event loop в фоне: пул соединений и keep-alive пинги живут между репликами
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="brain-loop", daemon=True).start()
+    asyncio.run_coroutine_threadsafe(brain.warm_up(), loop).result()
 
-while True:
-    with sr.Microphone() as source:
-        print("Скажи что-нибудь...")
-        audio = recognizer.listen(source)
-        
     try:
-        text = recognizer.recognize_google(audio, language="ru-RU")  # можно "en-US"
+        while True:
+            try:
+                with sr.Microphone() as source:
+                    print("Скажи что-нибудь...")
+                    tracer.begin_turn()
+                    # Пока фраза звучит, стабильные промежуточные расшифровки уже отправляются в Brain
+                    text = recognizer.listen(
+                        source, on_partial=lambda partial: loop.call_soon_threadsafe(brain.prefetch, partial)
+                    )
+
+                # Озвучиваем ответ по предложениям, пока он ещё генерируется
+                sentences = queue.Queue()
+                answer = asyncio.run_coroutine_threadsafe(stream_to_queue(brain, text, sentences), loop)
+                speak_service.speak_queue(sentences)
+                answer.result()
+                tracer.end_turn()
 
-        response = asyncio.run(brain.get_answer(user_input=text))
-        speak_service.speak(response)
+                # Пока пользователь думает над следующей фразой, сворачиваем старую историю
+                asyncio.run_coroutine_threadsafe(brain.compact_history(), loop)
 
-    except sr.UnknownValueError:
-        speak_service.speak("Не понял речь")
-    except sr.RequestError:
-        speak_service.speak("Ошибка запроса к сервису")
+            except sr.UnknownValueError:
+                # Итоговой реплики не будет — упреждающий запрос по промежуточной речи не нужен
+                loop.call_soon_threadsafe(brain.discard_prefetch)
+                speak_service.speak("Не понял речь")
+                tracer.end_turn()
+            except sr.RequestError:
+                loop.call_soon_threadsafe(brain.discard_prefetch)
+                speak_service.speak("Ошибка запроса к сервису")
+                tracer.end_turn()
+    finally:
+        # Кэш страниц и соединения закрываются и при выходе по Ctrl+C
+        asyncio.run_coroutine_threadsafe(brain.close(), loop).result()
 
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="J.A.R.V.I.S в консоли")
+    parser.add_argument("--profile", action="store_true",
+                        help="профилировать все потоки (профиль сохраняется в ~/.jarvis/profiles при выходе)")
+    main(profile=parser.parse_args().profile)
@@ -4,6 +4,7 @@ JARVIS GUI Application
 Графический интерфейс пользователя для ассистента JARVIS в стилистике Железного Человека
 """
 
+import argparse
 import sys
 import os
 
@@ -13,4 +14,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from app.gui.jarvis_gui import main
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="J.A.R.V.I.S GUI")
+    parser.add_argument("--profile", action="store_true",
+                        help="профилировать все потоки с запуска (профиль сохраняется в ~/.jarvis/profiles)")
+    # Остальные аргументы достаются Qt
+    args, qt_args = parser.parse_known_args()
+    sys.argv = sys.argv[:1] + qt_args
+    main(profile=args.profile)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+JARVIS без интерфейса: локальный HTTP/WebSocket API к одному прогретому Brain.
+Клиенты (GUI, консоль, другие компьютеры) ведут свои сессии со своей историей.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.profiler import profiler
+from app.core.settings import Settings
+from app.server.api import BrainServer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="J.A.R.V.I.S API-сервер")
+    parser.add_argument("--host", default=Settings().SERVER_HOST)
+    parser.add_argument("--port", type=int, default=Settings().SERVER_PORT)
+    parser.add_argument("--max-concurrency", type=int, default=Settings().SERVER_MAX_CONCURRENCY,
+                        help="сколько ответов готовится одновременно (остальные ждут очереди)")
+    parser.add_argument("--max-sessions", type=int, default=Settings().SERVER_MAX_SESSIONS)
+    parser.add_argument("--profile", action="store_true",
+                        help="профилировать все потоки (профиль сохраняется в ~/.jarvis/profiles при выходе)")
+    args = parser.parse_args()
+
+    if args.profile:
+        profiler.start()
+    server = BrainServer(host=args.host, port=args.port, max_concurrency=args.max_concurrency,
+                         max_sessions=args.max_sessions)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass